@@ -0,0 +1,122 @@
+# Benchmark: inference backends (fp32 torch, int8 dynamic quantization, ONNX Runtime) on the same
+# inputs. Accuracy is measured against fp32 torch: cosine drift of chunk embeddings, top-k retrieval
+# agreement, and ROUGE of the summaries. Speed: encode throughput, single-query latency, and
+# summary latency.
+#
+# Usage: python backend/benchmarks/bench_backends.py manual.pdf notes.txt ... [--backends torch int8 onnx]
+import argparse
+import os
+import sys
+import time
+from collections import Counter
+
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from chunking import get_splitter, split_into_chunks
+from extraction import extract_files
+from inference_backends import BACKENDS, load_encoder, load_summarizer
+from model_registry import load_bart_tokenizer
+from retrieval import EmbeddingMatrix
+
+# The apps' summary settings
+GENERATION_PARAMS = dict(max_length=300, min_length=100, length_penalty=2.0, num_beams=4, early_stopping=True)
+
+
+def rouge_n(candidate, reference, n):
+    # F1 overlap of word n-grams
+    grams = lambda words: Counter(tuple(words[i:i + n]) for i in range(len(words) - n + 1))
+    cand, ref = grams(candidate.lower().split()), grams(reference.lower().split())
+    overlap = sum((cand & ref).values())
+    if not overlap:
+        return 0.0
+    precision, recall = overlap / sum(cand.values()), overlap / sum(ref.values())
+    return 2 * precision * recall / (precision + recall)
+
+
+def rouge_l(candidate, reference):
+    # F1 of the longest common word subsequence
+    a, b = candidate.lower().split(), reference.lower().split()
+    if not a or not b:
+        return 0.0
+    previous = [0] * (len(b) + 1)
+    for word in a:
+        current = [0]
+        for j, other in enumerate(b):
+            current.append(previous[j] + 1 if word == other else max(previous[j + 1], current[j]))
+        previous = current
+    lcs = previous[-1]
+    if not lcs:
+        return 0.0
+    precision, recall = lcs / len(a), lcs / len(b)
+    return 2 * precision * recall / (precision + recall)
+
+
+def percentile_ms(timings, q):
+    return float(np.percentile(np.array(timings) * 1e3, q))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("paths", nargs="+", help="PDF/DOCX/TXT files providing chunks and summary contexts")
+    parser.add_argument("--backends", nargs="+", default=list(BACKENDS))
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--summaries", type=int, default=5)
+    parser.add_argument("--k", type=int, default=3)
+    args = parser.parse_args()
+
+    files = []
+    for path in args.paths:
+        with open(path, "rb") as f:
+            files.append((os.path.basename(path), f.read()))
+    splitter = get_splitter("regex")  # Same chunks for every backend; the splitter isn't under test
+    chunks = [chunk for result in extract_files(files, workers=1) for chunk in split_into_chunks(result["text"], splitter=splitter)]
+    rng = np.random.default_rng(0)
+    # Queries: the first sentence of random chunks; contexts: runs of k consecutive chunks
+    queries = [chunks[i].split(". ")[0] for i in rng.integers(len(chunks), size=args.queries)]
+    contexts = [" ".join(chunks[i:i + args.k]) for i in rng.integers(max(1, len(chunks) - args.k), size=args.summaries)]
+    print(f"{len(chunks)} chunks, {len(queries)} queries, {len(contexts)} summary contexts")
+
+    tokenizer = load_bart_tokenizer()
+    context_ids = [tokenizer.encode(context, return_tensors="pt", max_length=1024, truncation=True) for context in contexts]
+
+    reference = None
+    for backend in args.backends:
+        encoder, summarizer = load_encoder(backend), load_summarizer(backend)
+        encoder.encode(chunks[:8])  # Warm-up
+
+        start = time.perf_counter()
+        embeddings = np.asarray(encoder.encode(chunks, batch_size=64))
+        encode_rate = len(chunks) / (time.perf_counter() - start)
+
+        query_timings, query_embeddings = [], []
+        for query in queries:
+            t = time.perf_counter()
+            query_embeddings.append(encoder.encode(query))
+            query_timings.append(time.perf_counter() - t)
+
+        summary_timings, summaries = [], []
+        for input_ids in context_ids:
+            t = time.perf_counter()
+            output_ids = summarizer.generate(input_ids, attention_mask=input_ids.new_ones(input_ids.shape), **GENERATION_PARAMS)
+            summary_timings.append(time.perf_counter() - t)
+            summaries.append(tokenizer.decode(output_ids[0], skip_special_tokens=True))
+
+        matrix = EmbeddingMatrix(embeddings)
+        hits = [[i for i, score in matrix.search(q, args.k)] for q in query_embeddings]
+        if reference is None:
+            reference = {"embeddings": matrix.matrix, "hits": hits, "summaries": summaries}
+
+        cosine = np.sum(matrix.matrix * reference["embeddings"], axis=1)
+        overlap = np.mean([len(set(h) & set(r)) / args.k for h, r in zip(hits, reference["hits"])])
+        rouge = [(rouge_n(s, r, 1), rouge_n(s, r, 2), rouge_l(s, r)) for s, r in zip(summaries, reference["summaries"])]
+        r1, r2, rl = np.mean(rouge, axis=0)
+
+        print(f"{backend:>6}: encode {encode_rate:8.1f} chunks/s  query p50 {percentile_ms(query_timings, 50):6.2f} ms  "
+              f"summary p50 {percentile_ms(summary_timings, 50):8.0f} ms")
+        print(f"{'':>6}  vs {args.backends[0]}: cosine mean {cosine.mean():.5f} min {cosine.min():.5f}  "
+              f"top-{args.k} overlap {overlap:.3f}  ROUGE-1 {r1:.3f} ROUGE-2 {r2:.3f} ROUGE-L {rl:.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+# Benchmark: query embedding throughput and latency with N concurrent clients, each client
+# calling bert_model.encode itself vs. all of them going through the micro-batching scheduler
+#
+# Usage: python backend/benchmarks/bench_batching.py [--clients 1 8 32] [--requests 200] [--max-wait-ms 10]
+import argparse
+import os
+import sys
+import threading
+import time
+
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from inference import ENCODE_MAX_BATCH, BatchedEncoder
+
+
+def run_clients(encode, queries, clients):
+    # Each client thread sends its share of the queries one at a time, like a request thread
+    latencies = []
+    lock = threading.Lock()
+
+    def client(share):
+        for query in share:
+            t = time.perf_counter()
+            encode(query)
+            with lock:
+                latencies.append(time.perf_counter() - t)
+
+    threads = [threading.Thread(target=client, args=(queries[i::clients],)) for i in range(clients)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    latencies = np.array(latencies) * 1e3
+    return len(queries) / elapsed, np.percentile(latencies, 50), np.percentile(latencies, 99)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--clients", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--max-wait-ms", type=float, default=10)
+    parser.add_argument("--max-batch", type=int, default=ENCODE_MAX_BATCH)
+    args = parser.parse_args()
+
+    from sentence_transformers import SentenceTransformer
+
+    model = SentenceTransformer("all-MiniLM-L6-v2", device="cpu")
+    rng = np.random.default_rng(0)
+    words = "contract clause payment term notice party liability renewal termination invoice".split()
+    queries = [" ".join(rng.choice(words, size=rng.integers(4, 16))) + f"? {i}" for i in range(args.requests)]
+    model.encode(queries[:8])  # Warm-up
+
+    for clients in args.clients:
+        encoder = BatchedEncoder(model, args.max_batch, args.max_wait_ms / 1000)
+        for name, encode in [("direct", model.encode), ("batched", encoder.encode)]:
+            rps, p50, p99 = run_clients(encode, queries, clients)
+            print(f"{clients:>3} clients {name:>8}: {rps:8.1f} req/s  p50 {p50:7.2f} ms  p99 {p99:7.2f} ms")
+        stats = encoder.stats()
+        print(f"{'':>20} mean batch {stats['mean_batch_size']}  max queue depth {stats['max_queue_depth']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+# Benchmark: sentence splitting + chunking throughput per strategy, with a parity check
+# against the original split_into_chunks (full en_core_web_sm pipeline, string concatenation)
+#
+# Usage: python backend/benchmarks/bench_chunking.py manual.pdf notes.txt ... [--strategies original spacy senter regex]
+import argparse
+import os
+import sys
+import time
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from chunking import get_splitter, split_into_chunks
+from extraction import extract_files
+from pipeline import clean_text
+
+
+def original_split_into_chunks(text, nlp, max_chunk_size=512):
+    # Copy of the implementation this replaces, kept here only as the baseline
+    doc = nlp(text)
+    sentences = [sent.text.strip() for sent in doc.sents]
+    chunks, current_chunk = [], ""
+    for sentence in sentences:
+        if len(current_chunk) + len(sentence) <= max_chunk_size:
+            current_chunk += " " + sentence
+        else:
+            chunks.append(current_chunk.strip())
+            current_chunk = sentence
+    if current_chunk:
+        chunks.append(current_chunk.strip())
+    return [chunk for chunk in chunks if chunk]
+
+
+def parity(chunks, reference):
+    # Share of the reference chunks reproduced exactly
+    remaining = set(chunks)
+    return sum(1 for chunk in reference if chunk in remaining) / max(len(reference), 1)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("paths", nargs="+", help="PDF/DOCX/TXT files to chunk")
+    parser.add_argument("--strategies", nargs="+", default=["original", "spacy", "senter", "regex"])
+    args = parser.parse_args()
+
+    files = []
+    for path in args.paths:
+        with open(path, "rb") as f:
+            files.append((os.path.basename(path), f.read()))
+    # The original pipeline can't take more than nlp.max_length characters in one call
+    texts = [clean_text(result["text"])[:999_999] for result in extract_files(files, workers=1)]
+    total_chars = sum(len(text) for text in texts)
+    print(f"{len(texts)} files, {total_chars} characters")
+
+    reference = None
+    for strategy in args.strategies:
+        if strategy == "original":
+            nlp = get_splitter("spacy").nlp
+            chunker = lambda text: original_split_into_chunks(text, nlp)
+        else:
+            splitter = get_splitter(strategy)  # Model loading is not part of the timing
+            chunker = lambda text: split_into_chunks(text, splitter=splitter)
+
+        start = time.perf_counter()
+        chunks = [chunk for text in texts for chunk in chunker(text)]
+        elapsed = time.perf_counter() - start
+
+        if reference is None:
+            reference = chunks
+        print(f"{strategy:>9}: {total_chars / elapsed:>12,.0f} chars/s  {len(chunks):>6} chunks  "
+              f"parity with {args.strategies[0]} {parity(chunks, reference):6.1%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,49 @@
+# Benchmark: text extraction of a PDF corpus with 1..N extraction processes
+#
+# Usage: python backend/benchmarks/bench_extraction.py manual1.pdf manual2.pdf ... [--workers 1 2 4 8]
+import argparse
+import os
+import sys
+import time
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import extraction
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("paths", nargs="+", help="PDF/DOCX/TXT files to extract")
+    parser.add_argument("--workers", type=int, nargs="+",
+                        default=sorted({1, 2, 4, 8, os.cpu_count() or 1}))
+    args = parser.parse_args()
+
+    files = []
+    for path in args.paths:
+        with open(path, "rb") as f:
+            files.append((os.path.basename(path), f.read()))
+
+    baseline, reference = None, None
+    for workers in args.workers:
+        # A fresh pool per run so every worker count pays its own start-up cost
+        extraction._pool = None
+        extraction.EXTRACT_WORKERS = workers
+        start = time.perf_counter()
+        results = extraction.extract_files(files, workers=workers)
+        elapsed = time.perf_counter() - start
+        if extraction._pool is not None:
+            extraction._pool.shutdown()
+
+        pages = [page for result in results for page in result["pages"]]
+        texts = [result["text"] for result in results]
+        if baseline is None:
+            baseline, reference = elapsed, texts
+            slowest = max(pages, key=lambda page: page["seconds"]) if pages else None
+            print(f"{len(files)} files, {len(pages)} pages, "
+                  f"mean {1e3 * sum(p['seconds'] for p in pages) / max(len(pages), 1):.1f} ms/page"
+                  + (f", slowest page {slowest['page']} at {1e3 * slowest['seconds']:.1f} ms" if slowest else ""))
+        print(f"{workers:>3} workers: {elapsed:7.2f}s  {len(pages) / elapsed:7.1f} pages/s  "
+              f"speedup {baseline / elapsed:4.2f}x  same text {texts == reference}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+# Benchmark: chunk embedding throughput when ingesting many small files.
+#   per-file:   one encode call per file (the old upload loop), passes as full as that file's chunk count
+#   batched:    every file's chunks in one stream, encoded in batches that span files
+#   concurrent: several uploads at once, each encoding per file, directly vs. through the shared
+#               ingestion batcher that merges their chunks
+#
+# Usage: python backend/benchmarks/bench_ingest.py [--files 200] [--clients 8] [--batch-size 32] [paths ...]
+import argparse
+import os
+import sys
+import threading
+import time
+
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from chunking import get_splitter, split_into_chunks
+from inference import ENCODE_BATCH_SIZE, INGEST_MAX_BATCH, BatchedEncoder
+from pipeline import EMBED_BATCH_SIZE, iter_batches
+
+
+def synthetic_files(count, rng):
+    # Short notes of 1-6 paragraphs: one to a few chunks each, like a folder of .txt files
+    words = ("contract clause payment term notice party liability renewal termination invoice supplier "
+             "delivery warranty schedule amendment breach remedy confidential agreement period").split()
+    files = []
+    for i in range(count):
+        sentences = [" ".join(rng.choice(words, size=rng.integers(6, 30))).capitalize() + "."
+                     for _ in range(rng.integers(3, 40))]
+        files.append(f"Note {i}. " + " ".join(sentences))
+    return files
+
+
+def run_clients(ingest, files, clients):
+    # Each client uploads its share of the files one at a time
+    def client(share):
+        for text in share:
+            ingest(text)
+
+    threads = [threading.Thread(target=client, args=(files[i::clients],)) for i in range(clients)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("paths", nargs="*", help="Text files to ingest (default: synthetic notes)")
+    parser.add_argument("--files", type=int, default=200)
+    parser.add_argument("--clients", type=int, default=8)
+    parser.add_argument("--batch-size", type=int, default=ENCODE_BATCH_SIZE, help="Texts per forward pass")
+    parser.add_argument("--max-batch", type=int, default=INGEST_MAX_BATCH)
+    args = parser.parse_args()
+
+    from sentence_transformers import SentenceTransformer
+
+    model = SentenceTransformer("all-MiniLM-L6-v2", device="cpu")
+    if args.paths:
+        files = []
+        for path in args.paths:
+            with open(path, encoding="utf-8", errors="ignore") as f:
+                files.append(f.read())
+    else:
+        files = synthetic_files(args.files, np.random.default_rng(0))
+    splitter = get_splitter("regex")
+    per_file = [split_into_chunks(text, splitter=splitter) for text in files]
+    chunks = [chunk for file_chunks in per_file for chunk in file_chunks]
+    print(f"{len(files)} files, {len(chunks)} chunks ({len(chunks) / len(files):.1f} per file)")
+    model.encode(chunks[:8])  # Warm-up
+
+    start = time.perf_counter()
+    for file_chunks in per_file:
+        model.encode(file_chunks)
+    baseline = len(chunks) / (time.perf_counter() - start)
+    print(f"{'per-file':>28}: {baseline:8.1f} chunks/s")
+
+    start = time.perf_counter()
+    for batch in iter_batches(chunks, EMBED_BATCH_SIZE):
+        model.encode(batch, batch_size=args.batch_size)
+    rate = len(chunks) / (time.perf_counter() - start)
+    print(f"{'batched across files':>28}: {rate:8.1f} chunks/s  ({rate / baseline:.2f}x)")
+
+    encoder = BatchedEncoder(model, args.max_batch, forward_batch_size=args.batch_size, name="ingest-batcher")
+    chunks_of = dict(zip(files, per_file))
+    for name, encode in [("direct", model.encode), ("ingestion batcher", encoder.encode)]:
+        elapsed = run_clients(lambda text: encode(chunks_of[text]), files, args.clients)
+        rate = len(chunks) / elapsed
+        print(f"{f'{args.clients} clients {name}':>28}: {rate:8.1f} chunks/s  ({rate / baseline:.2f}x)")
+    stats = encoder.stats()
+    print(f"{'':>28}  mean batch {stats['mean_batch_size']}  max queue depth {stats['max_queue_depth']}  "
+          f"padding efficiency {stats['padding']['padding_efficiency']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,51 @@
+# Benchmark: OCR ingestion of scanned documents (image-only PDFs, PNG/JPEG/TIFF). Extracts every
+# file serially in this process, then over the extraction process pool, and reports pages/s and
+# per-page OCR time (rasterization included) at the chosen DPI. Both runs start from an empty OCR
+# cache; a last run re-uploads the same files against the warm cache.
+#
+# Usage: python backend/benchmarks/bench_ocr.py scan.pdf page.png ... [--dpi 300] [--workers 8]
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("paths", nargs="+", help="Scanned PDFs and images")
+    parser.add_argument("--dpi", type=int, default=300)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args()
+
+    # Read at import by the extraction modules and inherited by the pool's processes
+    os.environ["DOCASSIST_OCR_DPI"] = str(args.dpi)
+    os.environ["DOCASSIST_EXTRACT_WORKERS"] = str(args.workers)
+    cache_dir = os.environ["DOCASSIST_OCR_CACHE_DIR"] = tempfile.mkdtemp(prefix="ocr-bench-")
+    sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+    from extraction import iter_pages
+
+    files = []
+    for path in args.paths:
+        with open(path, "rb") as f:
+            files.append((os.path.basename(path), f.read()))
+
+    runs = [(f"{workers:>3} workers", workers, True) for workers in sorted({1, args.workers})]
+    for name, workers, cold in runs + [("  re-upload", args.workers, False)]:
+        if cold:
+            for entry in os.scandir(cache_dir):
+                os.remove(entry.path)
+        start = time.perf_counter()
+        pages = list(iter_pages(files, workers))
+        elapsed = time.perf_counter() - start
+        seconds = np.array([page_seconds for i, number, text, page_seconds in pages])
+        chars = np.array([len(text) for i, number, text, page_seconds in pages])
+        print(f"{name} @ {args.dpi} DPI: {len(pages)} pages in {elapsed:7.2f} s = {len(pages) / elapsed:6.2f} pages/s  "
+              f"per page p50 {np.percentile(seconds, 50):5.2f} s p95 {np.percentile(seconds, 95):5.2f} s  "
+              f"{chars.mean():7.0f} chars/page, {np.sum(chars == 0)} empty")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+# Benchmark: padding efficiency (real tokens / padded tokens) on real documents, batching inputs
+# in document order vs. in length buckets. Only the tokenizers are loaded; no forward passes run.
+#   encoder: the documents' chunks in batches of --encode-batch (the ingestion path)
+#   bart:    summary contexts (runs of --k consecutive chunks) in batches of --generate-batch
+#
+# Usage: python backend/benchmarks/bench_padding.py manual.pdf notes.txt ... [--encode-batch 32] [--generate-batch 4]
+import argparse
+import os
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from bucketing import PaddingStats, length_buckets
+from chunking import get_splitter, split_into_chunks
+from extraction import extract_files
+from inference import ENCODE_BATCH_SIZE, GENERATE_BUCKET_SIZE
+from model_client import EMBEDDING_MODEL
+from model_registry import load_bart_tokenizer
+from summarization import MAX_INPUT_TOKENS
+
+
+def efficiency(lengths, batches):
+    padding = PaddingStats()
+    for batch in batches:
+        padding.record([lengths[i] for i in batch])
+    return padding.stats()["padding_efficiency"]
+
+
+def compare(name, lengths, batch_size):
+    in_order = [list(range(start, min(start + batch_size, len(lengths)))) for start in range(0, len(lengths), batch_size)]
+    bucketed = length_buckets(lengths, batch_size)
+    print(f"{name:>8}: {len(lengths)} inputs, batches of {batch_size}: padding efficiency "
+          f"document order {efficiency(lengths, in_order):.3f}  length buckets {efficiency(lengths, bucketed):.3f}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("paths", nargs="+", help="PDF/DOCX/TXT files")
+    parser.add_argument("--encode-batch", type=int, default=ENCODE_BATCH_SIZE)
+    parser.add_argument("--generate-batch", type=int, default=GENERATE_BUCKET_SIZE)
+    parser.add_argument("--k", type=int, default=3)
+    args = parser.parse_args()
+
+    from transformers import AutoTokenizer
+
+    files = []
+    for path in args.paths:
+        with open(path, "rb") as f:
+            files.append((os.path.basename(path), f.read()))
+    splitter = get_splitter("regex")
+    chunks = [chunk for result in extract_files(files, workers=1) for chunk in split_into_chunks(result["text"], splitter=splitter)]
+
+    encoder_tokenizer = AutoTokenizer.from_pretrained(f"sentence-transformers/{EMBEDDING_MODEL}")
+    lengths = [len(ids) for ids in encoder_tokenizer(chunks, truncation=True, max_length=256)["input_ids"]]  # The model's max_seq_length
+    compare("encoder", lengths, args.encode_batch)
+
+    bart_tokenizer = load_bart_tokenizer()
+    contexts = [" ".join(chunks[i:i + args.k]) for i in range(0, len(chunks), args.k)]
+    lengths = [len(ids) for ids in bart_tokenizer(contexts, truncation=True, max_length=MAX_INPUT_TOKENS)["input_ids"]]
+    compare("bart", lengths, args.generate_batch)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+# Microbenchmark: per-chunk cosine loop (old get_suggestions) vs. EmbeddingMatrix search
+#
+# Usage: python backend/benchmarks/bench_retrieval.py [--dim 384] [--k 3] [--repeat 5]
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from retrieval import EmbeddingMatrix
+
+
+def loop_search(query_embedding, document_chunks, k):
+    # Copy of the original implementation, kept here only as the baseline
+    def cosine_similarity(a, b):
+        return np.dot(a, b) / (np.linalg.norm(a) * np.linalg.norm(b))
+    return sorted(
+        [(chunk["text"], cosine_similarity(query_embedding, chunk["embedding"])) for chunk in document_chunks],
+        key=lambda x: x[1],
+        reverse=True
+    )[:k]
+
+
+def best_of(fn, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        timings.append(time.perf_counter() - start)
+    return min(timings), result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--k", type=int, default=3)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1_000, 10_000, 100_000])
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    print(f"{'chunks':>8} {'loop ms':>10} {'build ms':>10} {'search ms':>10} {'speedup':>8} {'same top-k':>10}")
+    for size in args.sizes:
+        embeddings = rng.standard_normal((size, args.dim)).astype(np.float32)
+        # The loop path works on JSON-style float lists, exactly as stored today
+        document_chunks = [{"text": str(i), "embedding": emb.tolist()} for i, emb in enumerate(embeddings)]
+        query = rng.standard_normal(args.dim).astype(np.float32)
+
+        loop_time, loop_result = best_of(lambda: loop_search(query, document_chunks, args.k), args.repeat)
+        build_time, matrix = best_of(lambda: EmbeddingMatrix(embeddings), args.repeat)
+        search_time, result = best_of(lambda: matrix.search(query, args.k), args.repeat)
+
+        same = [int(text) for text, _ in loop_result] == [i for i, _ in result]
+        print(f"{size:>8} {loop_time * 1e3:>10.2f} {build_time * 1e3:>10.2f} {search_time * 1e3:>10.3f} "
+              f"{loop_time / search_time:>7.0f}x {str(same):>10}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+# Benchmark: HNSW (faiss) library-wide search vs. the exact brute-force scan, with recall@k
+#
+# Usage: python backend/benchmarks/bench_vector_index.py [--chunks 1000000] [--documents 500] [--queries 200]
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from vector_index import VectorIndex, faiss, recall_at_k
+
+
+def percentiles(timings):
+    timings = np.array(timings) * 1e3
+    return np.percentile(timings, 50), np.percentile(timings, 99)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--chunks", type=int, default=1_000_000)
+    parser.add_argument("--documents", type=int, default=500)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=3)
+    args = parser.parse_args()
+
+    if faiss is None:
+        print("faiss is not installed: only the exact fallback will be measured")
+
+    rng = np.random.default_rng(0)
+    with tempfile.TemporaryDirectory() as path:
+        index = VectorIndex(path)
+        per_document = args.chunks // args.documents
+        start = time.perf_counter()
+        for i in range(args.documents):
+            # Each document's chunks cluster around a few topics, as real text embeddings do
+            topics = rng.standard_normal((8, args.dim))
+            embeddings = topics[rng.integers(len(topics), size=per_document)] + 0.5 * rng.standard_normal((per_document, args.dim))
+            index.add_document(f"doc-{i}", embeddings.astype(np.float32))
+        print(f"indexed {len(index)} chunks in {time.perf_counter() - start:.1f}s")
+
+        # Queries near stored vectors, like real questions are near real chunks
+        queries = [index._load_vectors()[rng.integers(len(index))] + 0.1 * rng.standard_normal(args.dim)
+                   for _ in range(args.queries)]
+
+        for name, search in [("hnsw", lambda q: index.search(q, args.k)),
+                             ("exact", lambda q: index.search(q, args.k, exact=True))]:
+            timings = []
+            for query in queries:
+                t = time.perf_counter()
+                search(query)
+                timings.append(time.perf_counter() - t)
+            p50, p99 = percentiles(timings)
+            print(f"{name:>6}: p50 {p50:.2f} ms  p99 {p99:.2f} ms")
+
+        print(f"recall@{args.k}: {recall_at_k(index, queries, args.k):.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+# Measurement: memory of a gunicorn deployment (gunicorn.conf.py, preloaded models) as the
+# worker count grows. Reports RSS, PSS and USS per process from /proc/<pid>/smaps_rollup (Linux).
+# PSS splits shared pages between the processes mapping them, so total PSS is the real footprint;
+# with the weights fork-shared it should stay nearly flat from 1 to 16 workers.
+#
+# Usage: python backend/benchmarks/measure_memory.py [--workers 1 2 4 8 16] [--app gg:app]
+import argparse
+import os
+import signal
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+
+def memory_kb(pid):
+    # {"rss": kB, "pss": kB, "uss": kB}; USS = pages only this process maps
+    fields = {}
+    with open(f"/proc/{pid}/smaps_rollup") as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) >= 2 and parts[0].endswith(":") and parts[1].isdigit():
+                fields[parts[0][:-1]] = int(parts[1])
+    return {"rss": fields.get("Rss", 0), "pss": fields.get("Pss", 0),
+            "uss": fields.get("Private_Clean", 0) + fields.get("Private_Dirty", 0)}
+
+
+def children(pid):
+    with open(f"/proc/{pid}/task/{pid}/children") as f:
+        return [int(child) for child in f.read().split()]
+
+
+def wait_ready(master, workers, url, timeout):
+    # Ready = all workers forked and the app answering
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if master.poll() is not None:
+            raise RuntimeError("gunicorn exited before becoming ready")
+        if len(children(master.pid)) >= workers:
+            try:
+                urllib.request.urlopen(url, timeout=5)
+                return
+            except urllib.error.HTTPError:
+                return  # Any HTTP answer means a worker is serving
+            except OSError:
+                pass
+        time.sleep(1)
+    raise TimeoutError(f"gunicorn not ready after {timeout}s")
+
+
+def measure(workers, app, port, timeout, settle):
+    env = dict(os.environ, DOCASSIST_WEB_WORKERS=str(workers), DOCASSIST_BIND=f"127.0.0.1:{port}")
+    master = subprocess.Popen([sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", app],
+                              cwd=BACKEND_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        wait_ready(master, workers, f"http://127.0.0.1:{port}/", timeout)
+        time.sleep(settle)  # Let workers finish importing lazily-touched pages
+        return memory_kb(master.pid), [memory_kb(pid) for pid in children(master.pid)]
+    finally:
+        master.send_signal(signal.SIGTERM)
+        master.wait(timeout=60)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8, 16])
+    parser.add_argument("--app", default="gg:app")
+    parser.add_argument("--port", type=int, default=5077)
+    parser.add_argument("--timeout", type=float, default=600)
+    parser.add_argument("--settle", type=float, default=5)
+    args = parser.parse_args()
+
+    mb = lambda kb: kb / 1024
+    print(f"{'workers':>7} {'master RSS':>11} {'worker RSS':>11} {'worker PSS':>11} {'worker USS':>11} "
+          f"{'total RSS':>10} {'total PSS':>10}")
+    for workers in args.workers:
+        master, per_worker = measure(workers, args.app, args.port, args.timeout, args.settle)
+        avg = lambda key: sum(w[key] for w in per_worker) / len(per_worker)
+        total_rss = master["rss"] + sum(w["rss"] for w in per_worker)
+        total_pss = master["pss"] + sum(w["pss"] for w in per_worker)
+        print(f"{workers:>7} {mb(master['rss']):>9.0f}MB {mb(avg('rss')):>9.0f}MB {mb(avg('pss')):>9.0f}MB "
+              f"{mb(avg('uss')):>9.0f}MB {mb(total_rss):>8.0f}MB {mb(total_pss):>8.0f}MB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,51 @@
+import threading
+
+
+def length_buckets(lengths, bucket_size):
+    # Indices sorted by length, longest first (ties keep input order), cut into buckets of bucket_size
+    order = sorted(range(len(lengths)), key=lambda i: -lengths[i])
+    bucket_size = max(1, bucket_size)
+    return [order[start:start + bucket_size] for start in range(0, len(order), bucket_size)]
+
+
+class PaddingStats:
+    """Real vs. padded tokens over the batches run: the share of each forward pass that isn't padding."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.real_tokens = 0
+        self.padded_tokens = 0
+        self.batches = 0
+
+    def record(self, lengths):
+        # One padded batch: every row is as long as its longest
+        if not lengths:
+            return
+        with self.lock:
+            self.real_tokens += sum(lengths)
+            self.padded_tokens += len(lengths) * max(lengths)
+            self.batches += 1
+
+    def stats(self):
+        with self.lock:
+            return {
+                "batches": self.batches,
+                "real_tokens": self.real_tokens,
+                "padded_tokens": self.padded_tokens,
+                "padding_efficiency": round(self.real_tokens / self.padded_tokens, 4) if self.padded_tokens else None,
+            }
+
+
+def run_bucketed(items, lengths, bucket_size, run, padding=None):
+    """Runs items through run(list_of_items) -> list_of_results in length buckets of at most bucket_size.
+
+    Similar lengths end up padded together, so little of each batch is padding; results come back
+    in the items' original order. padding (a PaddingStats) records every bucket run.
+    """
+    results = [None] * len(items)
+    for bucket in length_buckets(lengths, bucket_size):
+        if padding is not None:
+            padding.record([lengths[i] for i in bucket])
+        for i, result in zip(bucket, run([items[i] for i in bucket])):
+            results[i] = result
+    return results
@@ -0,0 +1,111 @@
+import os
+
+import numpy as np
+from pymongo import ASCENDING
+
+from embedding_codec import EMBEDDING_DTYPE, decode_embeddings, encode_embeddings
+
+# Chunks written per insert_many call
+CHUNK_BATCH_SIZE = int(os.environ.get("DOCASSIST_CHUNK_BATCH_SIZE", 500))
+
+
+def ensure_chunk_indexes(chunks_collection):
+    # (user_id, document_id, ordinal) serves per-document reads, point lookups of winning chunks and user scans
+    chunks_collection.create_index(
+        [("user_id", ASCENDING), ("document_id", ASCENDING), ("ordinal", ASCENDING)], unique=True
+    )
+    chunks_collection.create_index([("document_id", ASCENDING), ("ordinal", ASCENDING)])
+
+
+def chunk_records(user_id, document_id, texts, embeddings, start=0, dtype=EMBEDDING_DTYPE):
+    for i, (text, embedding) in enumerate(zip(texts, embeddings)):
+        yield {
+            "user_id": user_id,
+            "document_id": document_id,
+            "ordinal": start + i,
+            "text": text,
+            "embedding": encode_embeddings([embedding], dtype),
+        }
+
+
+def insert_chunks(chunks_collection, records, batch_size=CHUNK_BATCH_SIZE):
+    # Bulk-insert in bounded batches so no single write approaches the BSON/message size limits
+    inserted, batch = 0, []
+    for record in records:
+        batch.append(record)
+        if len(batch) >= batch_size:
+            inserted += len(chunks_collection.insert_many(batch, ordered=False).inserted_ids)
+            batch = []
+    if batch:
+        inserted += len(chunks_collection.insert_many(batch, ordered=False).inserted_ids)
+    return inserted
+
+
+def fetch_chunk_texts(chunks_collection, hits, user_id=None):
+    # hits: [(document_id, ordinal), ...] -> {(document_id, ordinal): text}, reading only the winning chunks
+    if not hits:
+        return {}
+    query = {"$or": [{"document_id": document_id, "ordinal": ordinal} for document_id, ordinal in hits]}
+    if user_id is not None:
+        query["user_id"] = user_id
+    return {
+        (chunk["document_id"], chunk["ordinal"]): chunk["text"]
+        for chunk in chunks_collection.find(query, {"_id": 0, "document_id": 1, "ordinal": 1, "text": 1})
+    }
+
+
+def load_embeddings(chunks_collection, document_id):
+    # All embeddings of one document in ordinal order, e.g. to (re)build its vector index entry
+    rows = [
+        decode_embeddings(chunk["embedding"])
+        for chunk in chunks_collection.find({"document_id": document_id}, {"_id": 0, "embedding": 1}).sort("ordinal", ASCENDING)
+    ]
+    return np.vstack(rows) if rows else np.empty((0, 0), dtype=np.float32)
+
+
+def ensure_file_indexes(files_collection):
+    # Ingested files are per user, so an upload never reveals what other users have uploaded
+    if "content_hash_1_fingerprint_1" in files_collection.index_information():
+        files_collection.drop_index("content_hash_1_fingerprint_1")  # The earlier, global key
+    files_collection.create_index(
+        [("user_id", ASCENDING), ("content_hash", ASCENDING), ("fingerprint", ASCENDING)], unique=True
+    )
+
+
+def find_ingested_file(files_collection, chunks_collection, user_id, content_hash, fingerprint):
+    # An earlier upload by the same user of byte-identical content, processed with the same
+    # chunking settings, whose chunks still exist
+    record = files_collection.find_one({"user_id": user_id, "content_hash": content_hash, "fingerprint": fingerprint}, {"_id": 0})
+    if record is None:
+        return None
+    stored = chunks_collection.count_documents({
+        "user_id": user_id,
+        "document_id": record["document_id"],
+        "ordinal": {"$gte": record["first_ordinal"], "$lt": record["first_ordinal"] + record["count"]},
+    })
+    return record if stored == record["count"] else None
+
+
+def record_ingested_file(files_collection, user_id, content_hash, fingerprint, document_id, first_ordinal, count):
+    files_collection.update_one(
+        {"user_id": user_id, "content_hash": content_hash, "fingerprint": fingerprint},
+        {"$set": {"document_id": document_id, "first_ordinal": first_ordinal, "count": count}},
+        upsert=True,
+    )
+
+
+def copy_chunk_records(chunks_collection, source, user_id, document_id, start):
+    # Chunks of an already-ingested file, re-labelled for a new document; nothing is re-extracted or re-encoded
+    chunks = chunks_collection.find(
+        {"user_id": user_id, "document_id": source["document_id"],
+         "ordinal": {"$gte": source["first_ordinal"], "$lt": source["first_ordinal"] + source["count"]}},
+        {"_id": 0, "ordinal": 1, "text": 1, "embedding": 1},
+    ).sort("ordinal", ASCENDING)
+    for chunk in chunks:
+        yield {
+            "user_id": user_id,
+            "document_id": document_id,
+            "ordinal": start + chunk["ordinal"] - source["first_ordinal"],
+            "text": chunk["text"],
+            "embedding": chunk["embedding"],
+        }
@@ -0,0 +1,153 @@
+import os
+import re
+import threading
+
+from pipeline import MAX_CHUNK_SIZE, iter_batches, iter_chunks, iter_sentences, per_file
+
+# Sentence splitter used for chunking: "senter" (spaCy, sentence recognizer only), "regex"
+# (rule-based, no model) or "spacy" (the full tagger/parser/NER pipeline, the original behaviour)
+SENTENCE_SPLITTER = os.environ.get("DOCASSIST_SENTENCE_SPLITTER", "senter")
+
+# How chunk size is measured: "tokens" (embedding tokenizer, packed up to the model's window)
+# or "chars" (MAX_CHUNK_SIZE characters, the original rule)
+CHUNK_MODE = os.environ.get("DOCASSIST_CHUNK_MODE", "tokens")
+
+# Tokens repeated from the end of one chunk at the start of the next (token mode only)
+CHUNK_OVERLAP_TOKENS = int(os.environ.get("DOCASSIST_CHUNK_OVERLAP_TOKENS", 0))
+
+# Sentences tokenized per call when counting tokens
+TOKENIZE_BATCH_SIZE = 256
+
+SPACY_MODEL = "en_core_web_sm"
+
+# Texts per nlp.pipe() call
+SPACY_BATCH_SIZE = 8
+
+# Components dropped for the senter-only pipeline (names absent from a model are ignored)
+SPACY_EXCLUDE = ["tok2vec", "tagger", "morphologizer", "parser", "attribute_ruler", "lemmatizer", "ner"]
+
+
+class SpacySplitter:
+    """Sentences from a spaCy pipeline: either the full model or only its senter component."""
+
+    def __init__(self, model=SPACY_MODEL, senter_only=True, batch_size=SPACY_BATCH_SIZE):
+        import spacy
+
+        if senter_only:
+            self.nlp = spacy.load(model, exclude=SPACY_EXCLUDE)
+            if "senter" in self.nlp.disabled:
+                self.nlp.enable_pipe("senter")  # Shipped disabled, as the parser normally sets sentences
+        else:
+            self.nlp = spacy.load(model)
+        self.batch_size = batch_size
+        self.max_length = self.nlp.max_length
+
+    def split_many(self, texts):
+        # One list of sentences per text; nlp.pipe batches the texts through the model
+        for doc in self.nlp.pipe(texts, batch_size=self.batch_size):
+            yield [sent.text.strip() for sent in doc.sents]
+
+
+class RegexSplitter:
+    """Rule-based sentences: break after . ! or ? followed by whitespace and an upper-case start."""
+
+    ABBREVIATIONS = {"mr", "mrs", "ms", "dr", "prof", "sr", "jr", "st", "vs", "etc", "e.g", "i.e", "fig", "no", "inc", "ltd", "co"}
+    BOUNDARY = re.compile(r"""(?<=[.!?])(["')\]]*)\s+(?=["'(\[]?[A-Z0-9])""")
+
+    batch_size = 64
+    max_length = 10 ** 9
+
+    def split(self, text):
+        sentences, start = [], 0
+        for match in self.BOUNDARY.finditer(text):
+            sentence = text[start:match.end(1)]
+            words = sentence.rsplit(None, 1)
+            last_word = words[-1].rstrip(".!?\"')]").lower() if words else ""
+            if last_word in self.ABBREVIATIONS or (len(last_word) == 1 and last_word.isalpha()):
+                continue  # "Dr. Smith", "J. Doe": not a sentence end
+            sentences.append(sentence.strip())
+            start = match.end()
+        if text[start:].strip():
+            sentences.append(text[start:].strip())
+        return sentences
+
+    def split_many(self, texts):
+        for text in texts:
+            yield self.split(text)
+
+
+_splitters = {}
+_splitters_lock = threading.Lock()
+
+
+def get_splitter(name=SENTENCE_SPLITTER):
+    # Splitters (and their spaCy models) are created once per process
+    with _splitters_lock:
+        if name not in _splitters:
+            if name == "senter":
+                _splitters[name] = SpacySplitter(senter_only=True)
+            elif name == "spacy":
+                _splitters[name] = SpacySplitter(senter_only=False)
+            elif name == "regex":
+                _splitters[name] = RegexSplitter()
+            else:
+                raise ValueError(f"Unknown sentence splitter: {name}")
+        return _splitters[name]
+
+
+def split_long_sentence(sentence, tokenizer, max_tokens, overlap_tokens):
+    # A sentence longer than the window is cut at token boundaries, windows overlapping by overlap_tokens
+    offsets = tokenizer(sentence, add_special_tokens=False, return_offsets_mapping=True)["offset_mapping"]
+    step = max(1, max_tokens - overlap_tokens)
+    for start in range(0, len(offsets), step):
+        end = min(start + max_tokens, len(offsets))
+        yield sentence[offsets[start][0]:offsets[end - 1][1]], end - start
+        if end == len(offsets):
+            break
+
+
+def iter_token_chunks(sentences, tokenizer, max_tokens, overlap_tokens=CHUNK_OVERLAP_TOKENS):
+    """Pack sentences into chunks of at most max_tokens tokens of the embedding tokenizer.
+
+    Chunks fill the encoder window as far as whole sentences allow, so fewer, fuller forward
+    passes are needed. The last sentences of a chunk (up to overlap_tokens) start the next one.
+    """
+    parts, lengths, total = [], [], 0
+    for batch in iter_batches(sentences, TOKENIZE_BATCH_SIZE):
+        counts = [len(ids) for ids in tokenizer(batch, add_special_tokens=False)["input_ids"]]
+        for sentence, count in zip(batch, counts):
+            pieces = [(sentence, count)] if count <= max_tokens else split_long_sentence(sentence, tokenizer, max_tokens, overlap_tokens)
+            for piece, piece_count in pieces:
+                if parts and total + piece_count > max_tokens:
+                    yield " ".join(parts)
+                    # Carry the tail of the finished chunk over as overlap
+                    keep, kept = 0, 0
+                    while keep < len(parts) and kept + lengths[-1 - keep] <= overlap_tokens and kept + lengths[-1 - keep] + piece_count <= max_tokens:
+                        kept += lengths[-1 - keep]
+                        keep += 1
+                    parts, lengths, total = parts[len(parts) - keep:], lengths[len(lengths) - keep:], kept
+                parts.append(piece)
+                lengths.append(piece_count)
+                total += piece_count
+    if parts:
+        yield " ".join(parts)
+
+
+def chunk_sentences(sentences, tokenizer=None, max_tokens=None, mode=CHUNK_MODE, max_chunk_size=MAX_CHUNK_SIZE):
+    # (file_index, sentence) -> (file_index, chunk). Token mode needs the embedding model's
+    # tokenizer and window; without them, characters are used
+    if mode == "tokens" and tokenizer is not None:
+        return per_file(iter_token_chunks, sentences, tokenizer, max_tokens - 2)  # Room for [CLS] and [SEP]
+    return per_file(iter_chunks, sentences, max_chunk_size)
+
+
+def chunking_fingerprint(model_name, mode=CHUNK_MODE):
+    # Everything that decides how a file is cut into chunks and embedded; files are only
+    # deduplicated against earlier uploads processed with the same settings
+    return f"{model_name}|{mode}|{SENTENCE_SPLITTER}|{MAX_CHUNK_SIZE}|{CHUNK_OVERLAP_TOKENS}"
+
+
+def split_into_chunks(text, max_chunk_size=MAX_CHUNK_SIZE, splitter=None, tokenizer=None, max_tokens=None):
+    # Whole-text convenience for the single-file apps; ingestion streams through pipeline instead
+    sentences = iter_sentences([(0, text)], splitter or get_splitter())
+    return [chunk for _, chunk in chunk_sentences(sentences, tokenizer, max_tokens, max_chunk_size=max_chunk_size)]
@@ -0,0 +1,171 @@
+import json
+import os
+import re
+import secrets
+import threading
+import time
+
+import numpy as np
+
+from cache import LRUCache
+from retrieval import DEFAULT_TOP_K, EmbeddingMatrix
+
+# Processed documents kept in process memory; older ones are reloaded from SESSION_DIR when used again
+SESSION_CACHE_SIZE = int(os.environ.get("DOCASSIST_SESSION_CACHE_SIZE", 64))
+
+# Seconds a session stays usable after its last use
+SESSION_TTL = float(os.environ.get("DOCASSIST_SESSION_TTL", 24 * 3600))
+
+# Where sessions are written, so they outlive memory eviction and are shared by every worker
+# process of the app (empty: memory only)
+SESSION_DIR = os.environ.get("DOCASSIST_SESSION_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "sessions"))
+
+# Creations between two sweeps of expired sessions from SESSION_DIR
+_SWEEP_EVERY = 50
+
+_SESSION_ID = re.compile(r"^[A-Za-z0-9_-]{16,64}$")
+
+
+class DocumentSession:
+    """Chunk texts of one processed document and their normalized float32 embedding matrix."""
+
+    def __init__(self, texts, embeddings):
+        self.texts = list(texts)
+        self.matrix = EmbeddingMatrix(embeddings)
+
+    def __len__(self):
+        return len(self.texts)
+
+    def search(self, query_embedding, k=DEFAULT_TOP_K):
+        # Returns [(text, score), ...] best first
+        return [(self.texts[i], score) for i, score in self.matrix.search(query_embedding, k)]
+
+
+class DocumentSessionStore:
+    """Processed documents behind opaque session ids, so clients never hold chunks or embeddings.
+
+    Sessions are written through to `directory` when created (<id>.npy matrix, <id>.json texts);
+    memory keeps the most recently used ones. A session unused for `ttl` seconds expires in both.
+    """
+
+    def __init__(self, memory_size=SESSION_CACHE_SIZE, ttl=SESSION_TTL, directory=SESSION_DIR):
+        self.memory = LRUCache(memory_size, ttl)
+        self.ttl = ttl
+        self.directory = directory or None
+        self.lock = threading.Lock()
+        self.counts = {"created": 0, "disk_loads": 0, "expired": 0}
+        if self.directory:
+            os.makedirs(self.directory, exist_ok=True)
+
+    def create(self, texts, embeddings):
+        session = DocumentSession(texts, embeddings)
+        session_id = secrets.token_urlsafe(24)
+        self._write(session_id, session)
+        self.memory.put(session_id, session)
+        with self.lock:
+            self.counts["created"] += 1
+            sweep = self.counts["created"] % _SWEEP_EVERY == 0
+        if sweep:
+            self._sweep()
+        return session_id
+
+    def get(self, session_id):
+        # None for unknown or expired sessions
+        if not session_id or not _SESSION_ID.match(session_id):
+            return None
+        session = self.memory.get(session_id)
+        if session is None:
+            session = self._read(session_id)
+            if session is not None:
+                self._count("disk_loads")
+                self.memory.put(session_id, session)
+        elif self.directory and not self._touch(session_id):
+            # Deleted or expired through another worker process: its files are gone
+            self.memory.pop(session_id)
+            return None
+        else:
+            self.memory.put(session_id, session)  # Restarts its TTL
+        return session
+
+    def delete(self, session_id):
+        if not session_id or not _SESSION_ID.match(session_id):
+            return False
+        found = self.memory.pop(session_id) is not None
+        if self.directory:
+            for path in self._paths(session_id):
+                try:
+                    os.remove(path)
+                    found = True
+                except OSError:
+                    pass
+        return found
+
+    def _count(self, name):
+        with self.lock:
+            self.counts[name] += 1
+
+    def _paths(self, session_id):
+        base = os.path.join(self.directory, session_id)
+        return base + ".npy", base + ".json"
+
+    def _touch(self, session_id):
+        # Last use, for the disk tier's expiry; False when the session's files no longer exist
+        try:
+            os.utime(self._paths(session_id)[1])
+        except OSError:
+            return False
+        return True
+
+    def _write(self, session_id, session):
+        if not self.directory:
+            return
+        matrix_path, texts_path = self._paths(session_id)
+        try:
+            with open(matrix_path + ".tmp", "wb") as f:
+                np.save(f, session.matrix.matrix)
+            os.replace(matrix_path + ".tmp", matrix_path)
+            # The texts file goes last: its presence marks a complete session
+            with open(texts_path + ".tmp", "w") as f:
+                json.dump(session.texts, f)
+            os.replace(texts_path + ".tmp", texts_path)
+        except OSError as e:
+            print(f"Error writing document session: {e}")
+
+    def _read(self, session_id):
+        if not self.directory:
+            return None
+        matrix_path, texts_path = self._paths(session_id)
+        try:
+            if time.time() - os.path.getmtime(texts_path) > self.ttl:
+                self._count("expired")
+                self.delete(session_id)
+                return None
+            with open(texts_path) as f:
+                texts = json.load(f)
+            session = DocumentSession(texts, np.load(matrix_path))
+        except (OSError, ValueError):
+            return None
+        self._touch(session_id)
+        return session
+
+    def _sweep(self):
+        # Removes sessions unused for longer than the TTL
+        if not self.directory:
+            return
+        cutoff = time.time() - self.ttl
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith(".json"):
+                try:
+                    expired = entry.stat().st_mtime < cutoff
+                except OSError:
+                    continue  # Removed by another process meanwhile
+                if expired:
+                    self._count("expired")
+                    self.delete(entry.name[:-len(".json")])
+
+    def stats(self):
+        with self.lock:
+            counts = dict(self.counts)
+        counts["memory"] = self.memory.stats()
+        counts["directory"] = self.directory
+        return counts
@@ -0,0 +1,117 @@
+import hashlib
+import os
+import threading
+
+import numpy as np
+from pymongo import UpdateOne
+
+from cache import LRUCache
+from embedding_codec import decode_embeddings, encode_embeddings
+from inference_backends import ENCODER_BACKEND
+from pipeline import clean_text
+
+# Embeddings kept in process memory (384 float32 values = 1.5 KB each)
+EMBEDDING_CACHE_SIZE = int(os.environ.get("DOCASSIST_EMBEDDING_CACHE_SIZE", 20_000))
+
+
+def embedding_key(model_name, text, backend=ENCODER_BACKEND):
+    # Content address: the same text under the same model always has the same embedding. The
+    # backend is part of it, as int8/ONNX embeddings differ slightly from fp32 ones
+    return hashlib.sha256(f"{model_name}\0{backend}\0{clean_text(text)}".encode("utf-8")).hexdigest()
+
+
+class MongoEmbeddingStore:
+    """Persistent tier: one packed embedding per content key in a MongoDB collection."""
+
+    def __init__(self, collection):
+        self.collection = collection
+
+    def ensure_indexes(self):
+        self.collection.create_index("key", unique=True)
+
+    def get_many(self, keys):
+        found = self.collection.find({"key": {"$in": list(keys)}}, {"_id": 0, "key": 1, "embedding": 1})
+        return {record["key"]: decode_embeddings(record["embedding"])[0] for record in found}
+
+    def put_many(self, items):
+        # Upserts so concurrent uploads of the same text don't collide on the unique key
+        if items:
+            self.collection.bulk_write([
+                UpdateOne({"key": key}, {"$setOnInsert": {"key": key, "embedding": encode_embeddings([embedding], "float32")}}, upsert=True)
+                for key, embedding in items.items()
+            ], ordered=False)
+
+
+class EmbeddingCache:
+    """Content-addressed embeddings: memory LRU, then a persistent store, then the model for the rest."""
+
+    def __init__(self, model_name, encode, store=None, memory_size=EMBEDDING_CACHE_SIZE, backend=ENCODER_BACKEND):
+        self.model_name = model_name
+        self.backend = backend
+        self.encode_fn = encode  # encode(list_of_texts) -> (n, dim) array
+        self.store = store
+        self.memory = LRUCache(memory_size)
+        self.lock = threading.Lock()
+        self.counts = {"memory_hits": 0, "store_hits": 0, "misses": 0, "encoded": 0}
+
+    def encode(self, texts):
+        keys = [embedding_key(self.model_name, text, self.backend) for text in texts]
+        found = {}
+        for key in set(keys):
+            embedding = self.memory.get(key)
+            if embedding is not None:
+                found[key] = embedding
+        memory_hits = len(found)
+
+        missing = [key for key in set(keys) if key not in found]
+        if missing and self.store is not None:
+            try:
+                stored = self.store.get_many(missing)
+            except Exception as e:
+                print(f"Error reading embedding cache: {e}")
+                stored = {}
+            for key, embedding in stored.items():
+                found[key] = embedding
+                self.memory.put(key, embedding)
+        store_hits = len(found) - memory_hits
+
+        # Only what no tier had is encoded, as one batch, each distinct text once. The normalized
+        # text is encoded, as that is what the key stands for
+        to_encode = {}
+        for key, text in zip(keys, texts):
+            if key not in found and key not in to_encode:
+                to_encode[key] = clean_text(text)
+        if to_encode:
+            embeddings = np.asarray(self.encode_fn(list(to_encode.values())), dtype=np.float32)
+            # Copies, so a cached row doesn't keep its whole batch's array alive
+            new = {key: embedding.copy() for key, embedding in zip(to_encode.keys(), embeddings)}
+            for key, embedding in new.items():
+                found[key] = embedding
+                self.memory.put(key, embedding)
+            if self.store is not None:
+                try:
+                    self.store.put_many(new)
+                except Exception as e:
+                    print(f"Error writing embedding cache: {e}")
+
+        with self.lock:
+            self.counts["memory_hits"] += memory_hits
+            self.counts["store_hits"] += store_hits
+            self.counts["misses"] += len(set(keys)) - memory_hits - store_hits
+            self.counts["encoded"] += len(to_encode)
+
+        if not texts:
+            return np.empty((0, 0), dtype=np.float32)
+        return np.vstack([found[key] for key in keys])
+
+    def stats(self):
+        with self.lock:
+            counts = dict(self.counts)
+        lookups = counts["memory_hits"] + counts["store_hits"] + counts["misses"]
+        counts["hit_rate"] = round((lookups - counts["misses"]) / lookups, 4) if lookups else None
+        counts["memory"] = self.memory.stats()
+        return counts
+
+
+def file_hash(data):
+    return hashlib.sha256(data).hexdigest()
@@ -0,0 +1,51 @@
+import os
+
+import numpy as np
+from bson.binary import Binary
+
+# Storage precision for new uploads: "float32" (exact), "float16" (2x smaller) or "int8" (4x smaller)
+EMBEDDING_DTYPE = os.environ.get("DOCASSIST_EMBEDDING_DTYPE", "float32")
+
+SUPPORTED_DTYPES = ("float32", "float16", "int8")
+
+
+def encode_embeddings(embeddings, dtype=EMBEDDING_DTYPE):
+    # Pack a (chunks x dim) matrix into one BinData blob instead of a BSON array of doubles
+    if dtype not in SUPPORTED_DTYPES:
+        raise ValueError(f"Unsupported embedding dtype: {dtype}")
+    matrix = np.asarray(embeddings, dtype=np.float32)
+    if matrix.ndim == 1:
+        matrix = matrix.reshape(-1, matrix.shape[0]) if matrix.size else matrix.reshape(0, 0)
+    packed = {"dtype": dtype, "count": int(matrix.shape[0]), "dim": int(matrix.shape[1])}
+    if dtype == "int8":
+        # Symmetric per-row quantization; the scales are kept alongside as float32
+        scales = np.abs(matrix).max(axis=1) / 127.0
+        scales[scales == 0] = 1.0
+        quantized = np.rint(matrix / scales[:, None]).astype(np.int8)
+        packed["scales"] = Binary(scales.astype(np.float32).tobytes())
+        packed["data"] = Binary(quantized.tobytes())
+    else:
+        packed["data"] = Binary(np.ascontiguousarray(matrix, dtype=dtype).tobytes())
+    return packed
+
+
+def decode_embeddings(stored):
+    # Accepts both the packed format and the legacy list-of-float-lists format
+    if stored is None:
+        return np.empty((0, 0), dtype=np.float32)
+    if isinstance(stored, list):
+        return np.asarray(stored, dtype=np.float32)
+    shape = (stored["count"], stored["dim"])
+    if stored["dtype"] == "float32":
+        # Zero-copy view over the BSON bytes (read-only)
+        return np.frombuffer(stored["data"], dtype=np.float32).reshape(shape)
+    if stored["dtype"] == "float16":
+        return np.frombuffer(stored["data"], dtype=np.float16).reshape(shape).astype(np.float32)
+    if stored["dtype"] == "int8":
+        scales = np.frombuffer(stored["scales"], dtype=np.float32)
+        return np.frombuffer(stored["data"], dtype=np.int8).reshape(shape) * scales[:, None]
+    raise ValueError(f"Unsupported embedding dtype: {stored['dtype']}")
+
+
+def is_packed(stored):
+    return isinstance(stored, dict) and "data" in stored
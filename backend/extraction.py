@@ -0,0 +1,174 @@
+import io
+import os
+import math
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from ocr_pages import IMAGE_EXTENSIONS, OCR_DPI, OCR_ENABLED, OCR_LANG, OCR_MIN_CHARS, needs_ocr, ocr_image_file, ocr_pdf_page
+
+# Processes used to extract text; pdfplumber is pure Python, so threads would share one core
+EXTRACT_WORKERS = int(os.environ.get("DOCASSIST_EXTRACT_WORKERS", os.cpu_count() or 1))
+
+# A PDF is split into about this many page ranges per worker, so long and short files balance out
+RANGES_PER_WORKER = 2
+
+# ...but no range is longer than this, which bounds the text held per task while streaming
+MAX_PAGES_PER_TASK = int(os.environ.get("DOCASSIST_MAX_PAGES_PER_TASK", 16))
+
+SUPPORTED_EXTENSIONS = (".txt", ".pdf", ".docx") + IMAGE_EXTENSIONS
+
+# Bump whenever the same file may extract to different text than before (2: OCR of scanned pages)
+EXTRACTION_VERSION = 2
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _init_worker():
+    # The pool already runs one Tesseract per core; its own OpenMP threads would only oversubscribe.
+    # Set in the pool's processes only, so the web process's environment is left alone
+    os.environ.setdefault("OMP_THREAD_LIMIT", "1")
+
+
+def get_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=EXTRACT_WORKERS, initializer=_init_worker)
+        return _pool
+
+
+# pdfplumber and python-docx are imported where they're used: they're only needed in the
+# extraction processes, not to start the web app
+def count_pdf_pages(data):
+    import pdfplumber
+
+    with pdfplumber.open(io.BytesIO(data)) as pdf:
+        return len(pdf.pages)
+
+
+def extract_pdf_pages(data, first_page, last_page):
+    # Runs in a worker process: [(page_number, text, seconds), ...] for pages first_page..last_page-1.
+    # Pages with (almost) no text layer are rasterized and OCR'd here, so OCR spreads over the pool too;
+    # pages seen before come from the OCR cache, and digital pages are never rasterized
+    import pdfplumber
+
+    pages = []
+    with pdfplumber.open(io.BytesIO(data)) as pdf:
+        for number in range(first_page, last_page):
+            start = time.perf_counter()
+            try:
+                text = pdf.pages[number].extract_text() or ""
+            except Exception as e:
+                print(f"Error extracting PDF page {number + 1}: {str(e)}")
+                text = ""
+            if needs_ocr(text):
+                try:
+                    ocr_text = ocr_pdf_page(pdf.pages[number])
+                    if len(ocr_text.strip()) > len(text.strip()):
+                        text = ocr_text
+                except Exception as e:
+                    print(f"Error running OCR on PDF page {number + 1}: {str(e)}")
+            pages.append((number, text, time.perf_counter() - start))
+    return pages
+
+
+def extract_whole_file(filename, data):
+    # Runs in a worker process for formats without pages; reported as a single page. A file that
+    # can't be read (a corrupt .docx, a .txt that isn't UTF-8) is skipped, like a failing PDF page
+    start = time.perf_counter()
+    try:
+        if filename.endswith(".txt"):
+            text = data.decode("utf-8")
+        elif filename.endswith(".docx"):
+            import docx
+
+            text = "\n".join(para.text for para in docx.Document(io.BytesIO(data)).paragraphs)
+        else:
+            raise ValueError(f"Unsupported file format: {filename}!")
+    except Exception as e:
+        print(f"Error extracting {filename}: {str(e)}")
+        return []
+    return [(0, text, time.perf_counter() - start)]
+
+
+def extraction_fingerprint():
+    # Everything that decides what text a file extracts to; files ingested under other settings
+    # (e.g. before OCR, or with DOCASSIST_OCR=0) are extracted again rather than reused
+    return f"extract-v{EXTRACTION_VERSION}|ocr={int(OCR_ENABLED)}|{OCR_LANG}|{OCR_DPI}|{OCR_MIN_CHARS}"
+
+
+def page_ranges(page_count, parts, max_pages=MAX_PAGES_PER_TASK):
+    size = max(1, min(max_pages, math.ceil(page_count / max(1, parts))))
+    for start in range(0, page_count, size):
+        yield start, min(start + size, page_count)
+
+
+def extraction_tasks(files, workers):
+    # (file_index, function, args) per unit of work, created lazily in upload order
+    for i, (filename, data) in enumerate(files):
+        if filename.endswith(".pdf"):
+            try:
+                page_count = count_pdf_pages(data)
+            except Exception as e:
+                print(f"Error extracting PDF content: {str(e)}")
+                continue
+            for first_page, last_page in page_ranges(page_count, workers * RANGES_PER_WORKER):
+                yield i, extract_pdf_pages, (data, first_page, last_page)
+        elif filename.endswith(IMAGE_EXTENSIONS):
+            yield i, ocr_image_file, (data,)
+        else:
+            yield i, extract_whole_file, (filename, data)
+
+
+def iter_pages(files, workers=EXTRACT_WORKERS):
+    """Yield (file_index, page_number, text, seconds) for every page of every file, in order.
+
+    Work runs ahead on the process pool, but only a bounded window of page ranges is in flight,
+    so memory does not grow with the number of pages.
+    """
+    if workers <= 1:
+        for i, function, args in extraction_tasks(files, workers):
+            for page in function(*args):
+                yield (i,) + page
+        return
+
+    pool = get_pool()
+    window = deque()
+    for i, function, args in extraction_tasks(files, workers):
+        window.append((i, pool.submit(function, *args)))
+        if len(window) >= workers * RANGES_PER_WORKER:
+            i, future = window.popleft()
+            for page in future.result():
+                yield (i,) + page
+    while window:
+        i, future = window.popleft()
+        for page in future.result():
+            yield (i,) + page
+
+
+def extract_files(files, workers=EXTRACT_WORKERS):
+    """Extract the text of every (filename, bytes) pair, spreading files and page ranges over a process pool.
+
+    Returns one {"filename", "text", "pages": [{"page", "chars", "seconds"}]} per file, in upload
+    order, with each file's pages joined by newlines in page order.
+    """
+    pages_by_file = [[] for _ in files]
+    for i, number, text, seconds in iter_pages(files, workers):
+        pages_by_file[i].append((number, text, seconds))
+
+    results = []
+    for (filename, data), pages in zip(files, pages_by_file):
+        # Pages are separated like lines, so the last word of a page doesn't run into the next page's first
+        text = "\n".join(text for number, text, seconds in pages)
+        if filename.endswith(".pdf") and not text.strip():
+            print(f"No text found in the PDF: {filename}")
+        results.append({
+            "filename": filename,
+            "text": text,
+            "pages": [{"page": number + 1, "chars": len(page_text), "seconds": round(seconds, 4)}
+                      for number, page_text, seconds in pages],
+        })
+    return results
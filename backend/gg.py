@@ -1,17 +1,30 @@
 from flask import Flask, request, jsonify
-from sentence_transformers import SentenceTransformer
-from transformers import BartForConditionalGeneration, BartTokenizer
-import pdfplumber
-import docx
-import re
-import spacy
 import numpy as np
 from flask_cors import CORS
 import jwt
 from pymongo import MongoClient
 import datetime
-import uuid
 import os
+import threading
+import uuid
+from retrieval import DEFAULT_TOP_K, MAX_TOP_K, parse_top_k, search_chunks
+from vector_index import get_user_index
+from embedding_codec import EMBEDDING_DTYPE, decode_embeddings
+from chunk_store import (
+    chunk_records, copy_chunk_records, ensure_chunk_indexes, ensure_file_indexes, fetch_chunk_texts,
+    find_ingested_file, insert_chunks, load_embeddings, record_ingested_file,
+)
+from jobs import JobQueue, MongoJobStore
+from extraction import SUPPORTED_EXTENSIONS, extraction_fingerprint, iter_pages
+from ocr_pages import get_ocr_cache
+from pipeline import iter_batches, iter_file_texts, iter_sentences, track_pages
+from chunking import chunk_sentences, chunking_fingerprint
+from embedding_cache import EmbeddingCache, MongoEmbeddingStore, file_hash
+from query_cache import QueryCache
+from summarization import DISTILLED_SUMMARY_MODEL, Summarizer
+from model_client import EMBEDDING_MODEL, SUMMARY_MODEL, get_model_client
+from inference_backends import ENCODER_BACKEND
+from model_registry import ModelRegistry, register_models, register_summarizer
 
 app = Flask(__name__)
 CORS(app)
@@ -20,77 +33,177 @@ CORS(app)
 SECRET_KEY = "your_secret_key_here"
 
 # MongoDB connection (If you want to store documents)
+job_store = None  # Falls back to in-process job records without MongoDB
+embedding_store = None  # Without MongoDB, cached embeddings only live in memory
 try:
-    mongo_client = MongoClient("mongodb://localhost:27017/")  # Adjust if your MongoDB is hosted elsewhere
+    # connect=False: nothing connects until the first query, so importing the app never waits for
+    # MongoDB, and under gunicorn's preload each worker opens its own connections after the fork
+    mongo_client = MongoClient("mongodb://localhost:27017/", connect=False)  # Adjust if your MongoDB is hosted elsewhere
     db = mongo_client["DocAssist"]
     documents_collection = db["documents"]
-    print("Connected to MongoDB successfully!")
+    chunks_collection = db["chunks"]  # One record per chunk (text + packed embedding)
+    job_store = MongoJobStore(db["jobs"])
+    files_collection = db["files"]  # Content hash of every ingested file -> where its chunks are stored
+    embedding_store = MongoEmbeddingStore(db["embedding_cache"])
 except Exception as e:
     print(f"Error connecting to MongoDB: {e}")
 
+def ensure_mongo_indexes():
+    # In the background: with MongoDB down or slow this waits out server selection, not startup or /healthz
+    try:
+        ensure_chunk_indexes(chunks_collection)
+        ensure_file_indexes(files_collection)
+        job_store.ensure_indexes()
+        embedding_store.ensure_indexes()
+        print("Connected to MongoDB successfully!")
+    except Exception as e:
+        print(f"Error connecting to MongoDB: {e}")
+
 # Maximum allowed file size for uploads (16 MB in this case)
 app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16 MB
 
-# Load models
-bart_model = BartForConditionalGeneration.from_pretrained("facebook/bart-large-cnn").to("cpu")
-bert_model = SentenceTransformer('all-MiniLM-L6-v2', device="cpu")
-bart_tokenizer = BartTokenizer.from_pretrained("facebook/bart-large-cnn")
-nlp = spacy.load("en_core_web_sm")
+# Uploads are processed by background workers; requests only enqueue them
+ingest_queue = JobQueue(job_store)
+
+_started_in = None  # pid of the process the background tasks below were started in
+_started_lock = threading.Lock()
+
+@app.before_request
+def start_background_tasks():
+    # Once per process, on its first request: threads started at import would stay behind in
+    # gunicorn's master, and MongoDB would be queried before the fork
+    global _started_in
+    with _started_lock:
+        if _started_in == os.getpid():
+            return
+        _started_in = os.getpid()
+    if job_store is not None:
+        threading.Thread(target=ensure_mongo_indexes, name="mongo-indexes", daemon=True).start()
+    ingest_queue.start()
+
+# Models: from the shared model server when DOCASSIST_MODEL_SERVER is set, otherwise in-process.
+# Nothing loads at import; they warm up in the background (DOCASSIST_MODEL_WARMUP) or on first use
+models = ModelRegistry()
+model_client = get_model_client()
+bert_model, query_encoder, chunk_encoder, bart_tokenizer, bart_generator, sentence_splitter = register_models(models, model_client)
+models.warm_up()
+
+# Chunk embeddings by content, so text that was embedded before is never re-encoded. The rest goes
+# through the ingestion batcher, where chunks from every file of an upload, and from concurrent
+# uploads, share length-sorted forward passes
+embedding_cache = EmbeddingCache(EMBEDDING_MODEL, chunk_encoder.encode, embedding_store)
+
+# Query embeddings and top-k results for repeated queries (suggestion chips, retries, shared documents)
+query_cache = QueryCache(query_encoder.encode)
+
+# Summaries in the request's "mode" (see SUMMARY_MODES); BART outputs are cached per retrieved context,
+# as different questions often retrieve the same chunks
+summarizer = Summarizer(
+    {SUMMARY_MODEL: (bart_tokenizer, bart_generator),
+     DISTILLED_SUMMARY_MODEL: register_summarizer(models, model_client, DISTILLED_SUMMARY_MODEL)},
+    embedding_cache.encode, sentence_splitter,
+)
+
+def invalidate_document(user_id, document_id):
+    # Cached results for a document, and for its owner's library searches, are stale once it changes
+    query_cache.invalidate(document_id)
+    query_cache.invalidate(("user", user_id))
 
 # Helper functions
-def clean_text(text):
-    return re.sub(r"\s+", " ", text).strip()
-
-def split_into_chunks(text, max_chunk_size=512):
-    doc = nlp(text)
-    sentences = [sent.text.strip() for sent in doc.sents]
-    chunks, current_chunk = [], ""
-    for sentence in sentences:
-        if len(current_chunk) + len(sentence) <= max_chunk_size:
-            current_chunk += " " + sentence
-        else:
-            chunks.append(current_chunk.strip())
-            current_chunk = sentence
-    if current_chunk:
-        chunks.append(current_chunk.strip())
-    return chunks
-
-def process_text(content):
-    cleaned_content = clean_text(content)
-    chunks = split_into_chunks(cleaned_content)
-    embeddings = bert_model.encode(chunks)
-    return [{"text": chunk, "embedding": embeddings[i].tolist()} for i, chunk in enumerate(chunks)]
-
-def process_pdf(file):
+def ingest_document(job, user_id, document_id, files):
+    # Runs on an ingest worker as one stream: pages -> cleaned text -> sentences -> chunks ->
+    # embedding batches -> storage. Only one batch of chunks is in memory at a time.
+    # Files identical to an earlier upload reuse its chunks and skip the stream entirely.
+    # The encoder backend (fp32/int8/ONNX) and the stored embedding dtype decide the reused
+    # embeddings too, like the cache keys
+    fingerprint = (f"{chunking_fingerprint(EMBEDDING_MODEL)}|{extraction_fingerprint()}"
+                   f"|{ENCODER_BACKEND}|{EMBEDDING_DTYPE}")
+    hashes = [file_hash(data) for filename, data in files]
+    with job.stage("dedup"):
+        known = {}
+        for file_index, content_hash in enumerate(hashes):
+            source = find_ingested_file(files_collection, chunks_collection, user_id, content_hash, fingerprint)
+            if source is not None:
+                known[file_index] = source
+
+    page_stats = {}
+    index = get_user_index(user_id)
+    invalidate_document(user_id, document_id)
+    job.progress(0, len(files))
+    files_done = 0
+    chunk_count = 0
+    file_ranges = {}  # file_index -> [first_ordinal, count] of the files processed here
     try:
-        with pdfplumber.open(file) as pdf:
-            content = "".join(page.extract_text() for page in pdf.pages)
-            if not content:
-                print("No text found in the PDF.")  # If no text is extracted
-            else:
-                print(f"Extracted content: {content[:500]}...")  # Show first 500 characters for debugging
-    except Exception as e:
-        print(f"Error extracting PDF content: {str(e)}")
-    return process_text(content) if content else []  # Return empty list if no content
-
-def process_docx(file):
-    doc = docx.Document(file)
-    content = "\n".join(para.text for para in doc.paragraphs)
-    return process_text(content)
-
-def get_suggestions(user_input, document_chunks):
-    query_embedding = bert_model.encode(user_input)
-    def cosine_similarity(a, b):
-        return np.dot(a, b) / (np.linalg.norm(a) * np.linalg.norm(b))
-    results = sorted(
-        [(chunk["text"], cosine_similarity(query_embedding, chunk["embedding"])) for chunk in document_chunks],
-        key=lambda x: x[1],
-        reverse=True
-    )[:3]
-    relevant_texts = " ".join([r[0] for r in results])
-    input_ids = bart_tokenizer.encode(relevant_texts, return_tensors='pt', max_length=1024, truncation=True)
-    summary_ids = bart_model.generate(input_ids, max_length=300, min_length=100, length_penalty=2.0, num_beams=4, early_stopping=True)
-    summarized_text = bart_tokenizer.decode(summary_ids[0], skip_special_tokens=True)
+        for file_index, source in list(known.items()):
+            with job.stage("store"):
+                records = list(copy_chunk_records(chunks_collection, source, user_id, document_id, chunk_count))
+                if len(records) != source["count"]:
+                    # Its chunks were deleted since the dedup lookup: the file goes through the stream instead
+                    del known[file_index]
+                    continue
+                insert_chunks(chunks_collection, records)
+                if records:
+                    index.add_document(document_id, np.vstack([decode_embeddings(r["embedding"]) for r in records]),
+                                       first_ordinal=chunk_count, save=False)
+            chunk_count += len(records)
+            job.report(chunks_stored=chunk_count)
+            files_done += 1
+            job.progress(files_done, len(files))
+
+        new_files = [i for i in range(len(files)) if i not in known]
+        pages = job.timed("extract", track_pages(iter_pages([files[i] for i in new_files]), page_stats))
+        sentences = job.timed("split", iter_sentences(iter_file_texts(pages), sentence_splitter))
+        chunks = job.timed("split", chunk_sentences(sentences, bert_model.tokenizer, bert_model.max_seq_length))
+
+        for batch in iter_batches(chunks):
+            texts = [chunk for _, chunk in batch]
+            with job.stage("embed"):
+                embeddings = embedding_cache.encode(texts)
+            with job.stage("store"):
+                insert_chunks(chunks_collection, chunk_records(user_id, document_id, texts, embeddings, start=chunk_count))
+                # Add the new chunks to the user's vector index (incremental, no rebuild)
+                index.add_document(document_id, embeddings, first_ordinal=chunk_count, save=False)
+            for i, (file_index, _) in enumerate(batch):
+                file_ranges.setdefault(new_files[file_index], [chunk_count + i, 0])[1] += 1
+            chunk_count += len(batch)
+            job.report(chunks_stored=chunk_count)
+            # Chunks arrive in file order: every file before the batch's last one is complete
+            if len(known) + batch[-1][0] > files_done:
+                files_done = len(known) + batch[-1][0]
+                job.progress(files_done, len(files))
+
+        # Document data to save to MongoDB; the chunks themselves are in the chunks collection
+        document_data = {
+            "document_id": document_id,
+            "user_id": user_id,
+            "document_name": [filename for filename, data in files],
+            "chunk_count": chunk_count,
+            "uploaded_at": datetime.datetime.utcnow()
+        }
+        with job.stage("store"):
+            index.save(document_id)
+            documents_collection.insert_one(document_data)
+            for file_index, (first_ordinal, count) in file_ranges.items():
+                record_ingested_file(files_collection, user_id, hashes[file_index], fingerprint, document_id, first_ordinal, count)
+        job.progress(len(files), len(files))
+        print("Document saved to MongoDB successfully!")
+    except Exception:
+        # Don't leave half an upload behind
+        documents_collection.delete_one({"document_id": document_id})
+        chunks_collection.delete_many({"document_id": document_id})
+        index.remove_document(document_id)
+        raise
+    finally:
+        invalidate_document(user_id, document_id)
+        job.report(extraction=page_stats)
+
+    return {"document_id": document_id, "chunk_count": chunk_count, "reused_files": len(known)}
+
+def get_suggestions(user_input, document_chunks, k=DEFAULT_TOP_K, mode=None):
+    query_embedding = query_cache.embed(user_input)
+    results = search_chunks(query_embedding, document_chunks, k)
+    relevant_texts = " ".join([chunk["text"] for chunk, score in results])
+    summarized_text = summarizer.summarize([relevant_texts], mode, query_embedding)[0]
     unique_sentences = list(dict.fromkeys(summarized_text.split('. ')))
     return [{"bullet_point": sentence.strip()} for sentence in unique_sentences if sentence.strip()]
 
@@ -131,80 +244,180 @@ def process_document():
         for file in uploaded_files:
             print(f"Received file: {file.filename}")  # Log the filename to verify it's being received
 
-        all_chunks = []
         for file in uploaded_files:
-            if file.filename.endswith(".txt"):
-                content = file.read().decode("utf-8")
-                chunks = process_text(content)
-                all_chunks.extend(chunks)
-
-            elif file.filename.endswith(".pdf"):
-                chunks = process_pdf(file)
-                all_chunks.extend(chunks)
-
-            elif file.filename.endswith(".docx"):
-                chunks = process_docx(file)
-                all_chunks.extend(chunks)
-
-            else:
+            if not file.filename.endswith(SUPPORTED_EXTENSIONS):
                 return jsonify({"error": f"Unsupported file format: {file.filename}!"}), 400
 
         # Generate a unique document_id
         document_id = str(uuid.uuid4())
 
-        # Document data to save to MongoDB
-        document_data = {
-            "document_id": document_id,
-            "user_id": user_id,
-            "document_name": [file.filename for file in uploaded_files],
-            "document_chunks": all_chunks,  # Store chunks for all uploaded documents
-            "embeddings": [chunk["embedding"] for chunk in all_chunks],
-            "uploaded_at": datetime.datetime.utcnow()
-        }
-
-        try:
-            documents_collection.insert_one(document_data)
-            print("Document saved to MongoDB successfully!")
-            return jsonify({"message": "Files processed successfully!", "chunks": all_chunks})
-
-        except Exception as e:
-            print(f"Error saving document to MongoDB: {e}")
-            return jsonify({"error": f"Error saving documents: {e}"}), 500
+        # The upload streams are closed once this request ends, so hand the worker the bytes
+        files = [(file.filename, file.read()) for file in uploaded_files]
+        job_id = ingest_queue.submit(ingest_document, user_id, document_id, files,
+                                     user_id=user_id, document_id=document_id)
+        return jsonify({"message": "Files queued for processing!", "job_id": job_id, "document_id": document_id}), 202
 
     except Exception as e:
         print(f"Error during document processing: {e}")
         return jsonify({"error": f"Error processing document: {str(e)}"}), 500
 
+def load_document_embeddings(document_id):
+    # Older uploads keep a packed (or float-list) embeddings field on the document itself
+    document = documents_collection.find_one({"document_id": document_id}, {"embeddings": 1})
+    if document and document.get("embeddings") is not None:
+        return decode_embeddings(document["embeddings"])
+    return load_embeddings(chunks_collection, document_id)
+
+def get_chunk_texts(hits, user_id=None):
+    # hits: [(document_id, ordinal), ...] -> {(document_id, ordinal): text}
+    texts = fetch_chunk_texts(chunks_collection, hits, user_id)
+    legacy_ids = list({document_id for document_id, ordinal in hits if (document_id, ordinal) not in texts})
+    if legacy_ids:
+        # Uploads from before the chunks collection still have their chunks inline
+        for document in documents_collection.find({"document_id": {"$in": legacy_ids}}, {"document_id": 1, "document_chunks.text": 1}):
+            chunks = document.get("document_chunks", [])
+            for document_id, ordinal in hits:
+                if document_id == document["document_id"] and ordinal < len(chunks):
+                    texts[(document_id, ordinal)] = chunks[ordinal]["text"]
+    return texts
+
+@app.route("/jobs/<job_id>", methods=["GET"])
+def get_job_status(job_id):
+    # Extract JWT token from request headers
+    token = request.headers.get("Authorization")
+    if not token:
+        return jsonify({"error": "Token is missing!"}), 401
+
+    token = token.split(" ")[1]  # Assumes the token is sent as "Bearer <token>"
+    user_data = decode_jwt(token)
+    if not user_data:
+        return jsonify({"error": "Invalid or expired token!"}), 401
+
+    job = ingest_queue.get(job_id)
+    if not job or job.get("user_id") != user_data["user_id"]:
+        return jsonify({"error": "Job not found!"}), 404
+    return jsonify(job)
+
 @app.route("/get-suggestions", methods=["POST"])
 def get_suggestions_api():
     data = request.json
     user_input = data.get("user_input", "")
     document_id = data.get("document_id", "")
+    top_k = parse_top_k(data.get("top_k"))
+    if top_k is None:
+        return jsonify({"error": f"Invalid top_k: {data.get('top_k')}! Use a whole number from 1 to {MAX_TOP_K}."}), 400
     
-    # Retrieve the document from MongoDB using document_id
-    document = documents_collection.find_one({"document_id": document_id})
+    # Retrieve the document metadata from MongoDB using document_id
+    document = documents_collection.find_one({"document_id": document_id}, {"user_id": 1})
     
     if not document:
         return jsonify({"error": "Document not found!"}), 404
     
-    document_chunks = document["document_chunks"]
-    document_embeddings = document["embeddings"]
+    index = get_user_index(document["user_id"])
 
-    # Get the embedding for the user's input
-    query_embedding = bert_model.encode(user_input)
+    if not index.has_document(document_id):
+        # Uploaded before the index existed: build its entry once from the stored embeddings
+        index.add_document(document_id, load_document_embeddings(document_id))
 
-    def cosine_similarity(a, b):
-        return np.dot(a, b) / (np.linalg.norm(a) * np.linalg.norm(b))
+    def search(query_embedding, k):
+        # Score every chunk of the document and keep the top k
+        results = index.search(query_embedding, k, document_id=document_id)
+        # Only the winning chunks' text is read back from MongoDB
+        texts = get_chunk_texts([(document_id, r["chunk_index"]) for r in results])
+        return [{"text": texts.get((document_id, r["chunk_index"]))} for r in results]
 
-    # Find the most similar chunks based on the cosine similarity of embeddings
-    results = sorted(
-        [(chunk, cosine_similarity(query_embedding, emb)) for chunk, emb in zip(document_chunks, document_embeddings)],
-        key=lambda x: x[1],  # Sort by similarity score
-        reverse=True
-    )[:3]  # Top 3 suggestions
-
-    relevant_texts = [r[0] for r in results]
+    relevant_texts = query_cache.search(document_id, user_input, top_k, search, index.version())
     return jsonify({"suggestions": relevant_texts})
 
+@app.route("/healthz", methods=["GET"])
+def liveness():
+    # The process is up and serving; says nothing about the models
+    return jsonify({"status": "alive"})
+
+@app.route("/readyz", methods=["GET"])
+def readiness():
+    # Ready once every model is loaded, so traffic isn't routed to a worker still warming up
+    ready = models.ready()
+    return jsonify({"ready": ready, "models": models.status()}), 200 if ready else 503
+
+@app.route("/inference-stats", methods=["GET"])
+def inference_stats():
+    return jsonify({"encode": query_encoder.stats(), "encode_chunks": chunk_encoder.stats(), "generate": bart_generator.stats()})
+
+@app.route("/cache-stats", methods=["GET"])
+def cache_stats():
+    return jsonify({"embeddings": embedding_cache.stats(), **query_cache.stats(), "summaries": summarizer.stats(),
+                    "ocr": get_ocr_cache().stats()})
+
+# Users whose older uploads have already been checked against their vector index in this process.
+# Each worker process checks once on its own; adding a document twice is a no-op, even across processes
+synced_index_users = set()
+
+def sync_user_index(user_id):
+    # Documents uploaded before the index existed are added from their stored embeddings, once
+    if user_id in synced_index_users:
+        return get_user_index(user_id)
+    index = get_user_index(user_id)
+    added = []
+    for document in documents_collection.find({"user_id": user_id}, {"document_id": 1}):
+        if not index.has_document(document["document_id"]):
+            # The graph file is written once after the loop, not once per document
+            index.add_document(document["document_id"], load_document_embeddings(document["document_id"]), save=False)
+            added.append(document["document_id"])
+    if added:
+        index.save(*added)
+    synced_index_users.add(user_id)
+    return index
+
+@app.route("/search", methods=["POST"])
+def search_documents():
+    try:
+        # Extract JWT token from request headers
+        token = request.headers.get("Authorization")
+        if not token:
+            return jsonify({"error": "Token is missing!"}), 401
+
+        token = token.split(" ")[1]  # Assumes the token is sent as "Bearer <token>"
+        user_data = decode_jwt(token)
+        if not user_data:
+            return jsonify({"error": "Invalid or expired token!"}), 401
+
+        user_id = user_data["user_id"]
+
+        data = request.json
+        query = data.get("query", "")
+        top_k = parse_top_k(data.get("top_k"))
+        if not query:
+            return jsonify({"error": "Query is missing!"}), 400
+        if top_k is None:
+            return jsonify({"error": f"Invalid top_k: {data.get('top_k')}! Use a whole number from 1 to {MAX_TOP_K}."}), 400
+
+        index = sync_user_index(user_id)
+
+        def search(query_embedding, k):
+            # One search over the user's whole library instead of one request per document
+            results = index.search(query_embedding, k)
+
+            # Fetch only the winning chunks' text, plus the names of the documents they came from
+            texts = get_chunk_texts([(r["document_id"], r["chunk_index"]) for r in results], user_id)
+            document_names = {
+                document["document_id"]: document.get("document_name")
+                for document in documents_collection.find(
+                    {"user_id": user_id, "document_id": {"$in": list({r["document_id"] for r in results})}},
+                    {"document_id": 1, "document_name": 1}
+                )
+            }
+            for r in results:
+                r["document_name"] = document_names.get(r["document_id"])
+                r["text"] = texts.get((r["document_id"], r["chunk_index"]))
+            return results
+
+        results = query_cache.search(("user", user_id), query, top_k, search, index.version())
+        return jsonify({"results": results})
+
+    except Exception as e:
+        print(f"Error during search: {e}")
+        return jsonify({"error": f"Error searching documents: {str(e)}"}), 500
+
 if __name__ == "__main__":
     app.run(debug=True)
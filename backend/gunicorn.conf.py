@@ -0,0 +1,47 @@
+# Multi-worker deployment of the API with the models loaded once and shared between workers:
+#
+#   cd backend && gunicorn -c gunicorn.conf.py gg:app
+#
+# preload_app imports gg (and loads BART/MiniLM) in the master before forking, so every
+# worker maps the same physical pages for the weights. Those pages stay shared as long as
+# nothing writes to them: inference never writes weights, and freezing the garbage collector
+# keeps it from writing GC bookkeeping into the pages of the objects loaded before the fork.
+#
+# Per-process state and how the workers stay consistent:
+#   vector indexes   one VectorIndex per worker on the same directory; writes are serialized by
+#                    a lock file and every worker reloads documents.json when it changes
+#   result caches    per worker; cached results are keyed by the index version, so an upload
+#                    handled by one worker is seen by the others' next search
+#   index sync       each worker backfills older uploads once; duplicates are no-ops
+#   jobs             need MongoDB: the in-memory fallback store only answers polls in the
+#                    worker that queued the job
+#   MongoDB          the client is created with connect=False, so each worker opens its own
+#                    connections after the fork; indexes are created in the background then
+import gc
+import os
+
+# Load every model while importing the app in the master (not lazily, and not in a warm-up
+# thread, which wouldn't survive the fork) so the workers inherit them
+os.environ.setdefault("DOCASSIST_MODEL_WARMUP", "eager")
+
+bind = os.environ.get("DOCASSIST_BIND", "127.0.0.1:5000")
+workers = int(os.environ.get("DOCASSIST_WEB_WORKERS", 4))
+worker_class = "gthread"
+threads = int(os.environ.get("DOCASSIST_WEB_THREADS", 4))
+timeout = 120  # Cold BART generations can take a while on CPU
+preload_app = True
+
+
+def when_ready(server):
+    # Runs in the master once the app is loaded, before the first worker is forked
+    gc.collect()
+    gc.freeze()
+
+
+def post_fork(server, worker):
+    # Each worker gets its share of the cores for torch's intra-op threads instead of all of them
+    try:
+        import torch
+    except ImportError:
+        return
+    torch.set_num_threads(max(1, (os.cpu_count() or 1) // workers))
@@ -0,0 +1,254 @@
+import json
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+import numpy as np
+
+from bucketing import PaddingStats, run_bucketed
+
+# How long the scheduler holds a batch open for more requests once it sees concurrent load (seconds)
+BATCH_MAX_WAIT = float(os.environ.get("DOCASSIST_BATCH_MAX_WAIT_MS", 10)) / 1000
+
+# Largest batch per forward pass: query embeddings are cheap, beam-search generation is not
+ENCODE_MAX_BATCH = int(os.environ.get("DOCASSIST_ENCODE_MAX_BATCH", 64))
+GENERATE_MAX_BATCH = int(os.environ.get("DOCASSIST_GENERATE_MAX_BATCH", 8))
+
+# Inputs per generate() call within a batch: a batch is split into length buckets of this size, so a
+# short input isn't padded (and encoded) to the length of a 1024-token neighbour
+GENERATE_BUCKET_SIZE = int(os.environ.get("DOCASSIST_GENERATE_BUCKET_SIZE", 4))
+
+# Chunk embeddings at ingestion: the chunks of concurrent uploads are merged into batches of up to this many
+INGEST_MAX_BATCH = int(os.environ.get("DOCASSIST_INGEST_MAX_BATCH", 256))
+
+# Texts per forward pass within an ingestion batch; a batch is run as length buckets of this size
+ENCODE_BATCH_SIZE = int(os.environ.get("DOCASSIST_ENCODE_BATCH_SIZE", 32))
+
+
+class MicroBatcher:
+    """Collects single requests from many threads into batched calls of run_batch.
+
+    One scheduler thread owns the model, so concurrent requests never run competing forward
+    passes. A request arriving at an idle scheduler runs at once (no added latency at low
+    load); while requests are queueing up, each batch stays open up to max_wait for more.
+    """
+
+    def __init__(self, run_batch, max_batch_size, max_wait=BATCH_MAX_WAIT, name="batcher"):
+        self.run_batch = run_batch  # run_batch(list_of_items) -> list of results, in order
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.queue = queue.Queue()
+        self.lock = threading.Lock()
+        self.counts = {"requests": 0, "batches": 0, "max_queue_depth": 0, "queue_wait": 0.0, "run_time": 0.0}
+        self.batch_sizes = {}  # batch size -> number of batches
+        self.last_batch_groups = 0
+        self.carry = None  # A queued group that didn't fit in the previous batch
+        self.name = name
+        self.thread = None
+        self.pid = None
+
+    def _ensure_thread(self):
+        # Started on first use, and again in each forked child (e.g. gunicorn workers with
+        # preload_app): threads don't survive fork, so a parent's scheduler would never answer
+        if self.pid != os.getpid():
+            with self.lock:
+                if self.pid != os.getpid():
+                    self.queue = queue.Queue()
+                    self.carry = None
+                    self.thread = threading.Thread(target=self._loop, name=self.name, daemon=True)
+                    self.thread.start()
+                    self.pid = os.getpid()
+
+    def submit(self, item):
+        return self.submit_many([item])[0]
+
+    def submit_many(self, items):
+        # Blocks the calling (request) thread until every item's result is back. The items of
+        # one call are queued as one entry, so they're never split across batches unless they
+        # exceed max_batch_size
+        self._ensure_thread()
+        futures = []
+        for start in range(0, len(items), self.max_batch_size):
+            group = [(item, Future(), time.perf_counter()) for item in items[start:start + self.max_batch_size]]
+            self.queue.put(group)
+            futures.extend(future for item, future, queued_at in group)
+        with self.lock:
+            self.counts["max_queue_depth"] = max(self.counts["max_queue_depth"], self.queue.qsize())
+        return [future.result() for future in futures]
+
+    def _next_batch(self):
+        if self.carry is not None:
+            batch, self.carry = list(self.carry), None
+        else:
+            batch = list(self.queue.get())
+        groups = 1
+        # Under load (a queue behind this request, or the last batch wasn't alone) it's worth
+        # waiting a little to fill the batch; otherwise run now
+        loaded = not self.queue.empty() or self.last_batch_groups > 1
+        deadline = time.perf_counter() + (self.max_wait if loaded else 0)
+        while len(batch) < self.max_batch_size:
+            try:
+                group = (self.queue.get(timeout=max(0, deadline - time.perf_counter())) if loaded
+                         else self.queue.get_nowait())
+            except queue.Empty:
+                break
+            if len(batch) + len(group) > self.max_batch_size:
+                self.carry = group  # Doesn't fit: starts the next batch
+                break
+            batch.extend(group)
+            groups += 1
+        self.last_batch_groups = groups
+        return batch
+
+    def _loop(self):
+        while True:
+            batch = self._next_batch()
+            started = time.perf_counter()
+            items = [item for item, future, queued_at in batch]
+            try:
+                results = self.run_batch(items)
+                for (item, future, queued_at), result in zip(batch, results):
+                    future.set_result(result)
+            except Exception as e:
+                for item, future, queued_at in batch:
+                    future.set_exception(e)
+            finished = time.perf_counter()
+
+            with self.lock:
+                self.counts["requests"] += len(batch)
+                self.counts["batches"] += 1
+                self.counts["queue_wait"] += sum(started - queued_at for item, future, queued_at in batch)
+                self.counts["run_time"] += finished - started
+                self.batch_sizes[len(batch)] = self.batch_sizes.get(len(batch), 0) + 1
+
+    def stats(self):
+        with self.lock:
+            counts = dict(self.counts)
+            batch_sizes = dict(sorted(self.batch_sizes.items()))
+        requests, batches = counts.pop("requests"), counts.pop("batches")
+        return {
+            "requests": requests,
+            "batches": batches,
+            "queue_depth": self.queue.qsize(),
+            "max_queue_depth": counts["max_queue_depth"],
+            "mean_batch_size": round(requests / batches, 2) if batches else None,
+            "batch_sizes": batch_sizes,
+            "mean_queue_wait_ms": round(1000 * counts["queue_wait"] / requests, 2) if requests else None,
+            "mean_batch_run_ms": round(1000 * counts["run_time"] / batches, 2) if batches else None,
+        }
+
+
+class BatchedEncoder:
+    """SentenceTransformer.encode() through a MicroBatcher: concurrent callers share forward passes.
+
+    Queries (short, one per request) run each batch as one pass. For ingestion, forward_batch_size
+    splits a large batch of chunks, possibly from several uploads, into passes over length buckets
+    (see bucketing.py); padding efficiency is reported in stats().
+    """
+
+    def __init__(self, model, max_batch_size=ENCODE_MAX_BATCH, max_wait=BATCH_MAX_WAIT, forward_batch_size=None,
+                 name="encode-batcher"):
+        self.model = model
+        self.forward_batch_size = forward_batch_size
+        self.batcher = MicroBatcher(self._run, max_batch_size, max_wait, name=name)
+        self.padding = PaddingStats()
+
+    def _token_lengths(self, texts):
+        # Tokens per text as the model sees them (special tokens included, truncated like encode())
+        encoded = self.model.tokenizer(list(texts), truncation=True, max_length=self.model.max_seq_length)
+        return [len(ids) for ids in encoded["input_ids"]]
+
+    def _run(self, texts):
+        return run_bucketed(texts, self._token_lengths(texts), self.forward_batch_size or len(texts),
+                            lambda bucket: list(self.model.encode(bucket, batch_size=len(bucket))), self.padding)
+
+    def encode(self, texts):
+        # A single string gives one vector, a list gives one row per text (like model.encode)
+        if isinstance(texts, str):
+            return self.batcher.submit(texts)
+        return np.vstack(self.batcher.submit_many(texts)) if texts else np.empty((0, 0), dtype=np.float32)
+
+    def stats(self):
+        return {**self.batcher.stats(), "padding": self.padding.stats()}
+
+
+class BatchedGenerator:
+    """model.generate() through a MicroBatcher per set of generation parameters.
+
+    A batch is split into length buckets (see bucketing.py), each padded to a common length and
+    decoded together; each caller gets its own (1, length) row back, so it's a drop-in for
+    generate() on a single input.
+    """
+
+    def __init__(self, model, tokenizer, max_batch_size=GENERATE_MAX_BATCH, max_wait=BATCH_MAX_WAIT,
+                 bucket_size=GENERATE_BUCKET_SIZE):
+        self.model = model
+        self.tokenizer = tokenizer
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.bucket_size = bucket_size
+        self.batchers = {}  # Only requests with identical generation parameters can share a batch
+        self.padding = {}  # Padding of the encoder input, per batcher
+        self.lock = threading.Lock()
+
+    def _batcher(self, params):
+        key = json.dumps(params, sort_keys=True, default=str)
+        with self.lock:
+            if key not in self.batchers:
+                self.padding[key] = PaddingStats()
+                self.batchers[key] = MicroBatcher(lambda inputs: self._run(inputs, params, self.padding[key]),
+                                                  self.max_batch_size, self.max_wait, name="generate-batcher")
+            return self.batchers[key]
+
+    def _run(self, inputs, params, padding=None):
+        # Inputs of similar length are padded and decoded together; outputs come back in request order
+        return run_bucketed(inputs, [input_ids.shape[-1] for input_ids in inputs], self.bucket_size,
+                            lambda bucket: self._generate(bucket, params), padding)
+
+    def _generate(self, inputs, params):
+        batch = self.tokenizer.pad({"input_ids": [ids[0].tolist() for ids in inputs]}, return_tensors="pt")
+        outputs = self.model.generate(batch["input_ids"], attention_mask=batch["attention_mask"], **params)
+        return [outputs[i:i + 1] for i in range(len(inputs))]
+
+    def generate(self, input_ids, **params):
+        return self._batcher(params).submit(input_ids)
+
+    def generate_many(self, inputs, **params):
+        # Several inputs of one request, decoded in the same batch
+        return self._batcher(params).submit_many(list(inputs))
+
+    def stream(self, input_ids, **params):
+        # Yields decoded text as generate() produces tokens and returns the output ids. Runs outside
+        # the batchers (a streamer follows exactly one sequence), and only without beam search,
+        # whose best sequence isn't known until the end
+        from transformers import TextIteratorStreamer
+
+        batch = self.tokenizer.pad({"input_ids": [input_ids[0].tolist()]}, return_tensors="pt")
+        streamer = TextIteratorStreamer(self.tokenizer, skip_prompt=True, skip_special_tokens=True)
+        result = {}
+
+        def run():
+            try:
+                result["output_ids"] = self.model.generate(batch["input_ids"], attention_mask=batch["attention_mask"],
+                                                           streamer=streamer, **params)
+            except Exception as e:
+                result["error"] = e
+                streamer.end()
+
+        thread = threading.Thread(target=run, name="generate-stream", daemon=True)
+        thread.start()
+        for text in streamer:
+            if text:
+                yield text
+        thread.join()
+        if "error" in result:
+            raise result["error"]
+        return result["output_ids"]
+
+    def stats(self):
+        # One entry per set of generation parameters seen
+        with self.lock:
+            batchers = dict(self.batchers)
+        return {key: {**batcher.stats(), "padding": self.padding[key].stats()} for key, batcher in batchers.items()}
@@ -0,0 +1,59 @@
+import os
+
+from model_client import EMBEDDING_MODEL, SUMMARY_MODEL
+
+# How the models run on CPU:
+#   "torch": fp32 PyTorch, the original setup
+#   "int8":  PyTorch with dynamic int8 quantization of every Linear layer
+#   "onnx":  ONNX Runtime (needs optimum[onnxruntime]); BART's decoder runs with its KV cache
+INFERENCE_BACKEND = os.environ.get("DOCASSIST_INFERENCE_BACKEND", "torch")
+
+# Per-model overrides, e.g. a quantized encoder with an fp32 summarizer
+ENCODER_BACKEND = os.environ.get("DOCASSIST_ENCODER_BACKEND", INFERENCE_BACKEND)
+SUMMARIZER_BACKEND = os.environ.get("DOCASSIST_SUMMARIZER_BACKEND", INFERENCE_BACKEND)
+
+# Where exported ONNX models are kept, so the export only happens once per host
+ONNX_DIR = os.environ.get("DOCASSIST_ONNX_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "onnx"))
+
+BACKENDS = ("torch", "int8", "onnx")
+
+
+def quantize(model):
+    # Linear layers hold nearly all of both models' weights and time; int8 weights,
+    # activations quantized on the fly
+    import torch
+
+    return torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+
+
+def load_encoder(backend=ENCODER_BACKEND, model_name=EMBEDDING_MODEL):
+    # A SentenceTransformer whichever the backend, so encode(), tokenizer and max_seq_length don't change
+    from sentence_transformers import SentenceTransformer
+
+    if backend == "torch":
+        return SentenceTransformer(model_name, device="cpu")
+    if backend == "int8":
+        return quantize(SentenceTransformer(model_name, device="cpu"))
+    if backend == "onnx":
+        return SentenceTransformer(model_name, device="cpu", backend="onnx")
+    raise ValueError(f"Unknown inference backend: {backend}")
+
+
+def load_summarizer(backend=SUMMARIZER_BACKEND, model_name=SUMMARY_MODEL):
+    # Anything with generate(input_ids, attention_mask=..., **generation_params)
+    if backend in ("torch", "int8"):
+        from transformers import BartForConditionalGeneration
+
+        model = BartForConditionalGeneration.from_pretrained(model_name).to("cpu").eval()
+        return quantize(model) if backend == "int8" else model
+    if backend == "onnx":
+        from optimum.onnxruntime import ORTModelForSeq2SeqLM
+
+        path = os.path.join(ONNX_DIR, model_name.replace("/", "--"))
+        if os.path.isdir(path):
+            return ORTModelForSeq2SeqLM.from_pretrained(path, use_cache=True)
+        # Exports encoder, decoder and decoder-with-past (the KV-cached decoding step)
+        model = ORTModelForSeq2SeqLM.from_pretrained(model_name, export=True, use_cache=True)
+        model.save_pretrained(path)
+        return model
+    raise ValueError(f"Unknown inference backend: {backend}")
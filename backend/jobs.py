@@ -0,0 +1,215 @@
+import datetime
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+# Background workers processing uploads, independent of the web server's request threads
+INGEST_WORKERS = int(os.environ.get("DOCASSIST_INGEST_WORKERS", 2))
+
+# Seconds between two heartbeats of a process's unfinished jobs, and without one after which a
+# queued or running job is failed: the process that had it restarted or died
+JOB_HEARTBEAT_INTERVAL = float(os.environ.get("DOCASSIST_JOB_HEARTBEAT_INTERVAL", 30))
+JOB_STALE_AFTER = float(os.environ.get("DOCASSIST_JOB_STALE_AFTER", 120))
+
+UNFINISHED = ["queued", "running"]
+
+
+class MemoryJobStore:
+    """Job records kept in this process only.
+
+    With several web worker processes a status poll can land on a worker that never saw the
+    job and get a 404: multi-worker deployments need MongoDB (MongoJobStore).
+    """
+
+    def __init__(self):
+        self.jobs = {}
+        self.lock = threading.Lock()
+
+    def create(self, job):
+        with self.lock:
+            self.jobs[job["job_id"]] = job
+
+    def update(self, job_id, fields):
+        with self.lock:
+            self.jobs[job_id].update(fields)
+
+    def get(self, job_id):
+        with self.lock:
+            job = self.jobs.get(job_id)
+            return dict(job, timings=dict(job["timings"])) if job else None
+
+    def heartbeat(self, owner):
+        pass  # Jobs die with this process, and so does their record
+
+    def fail_stale(self, cutoff):
+        return 0
+
+
+class MongoJobStore:
+    """Job records in a MongoDB collection, so any web worker can answer status polls."""
+
+    def __init__(self, collection):
+        self.collection = collection
+
+    def ensure_indexes(self):
+        self.collection.create_index("job_id", unique=True)
+
+    def create(self, job):
+        self.collection.insert_one(dict(job))
+
+    def update(self, job_id, fields):
+        self.collection.update_one({"job_id": job_id}, {"$set": fields})
+
+    def get(self, job_id):
+        return self.collection.find_one({"job_id": job_id}, {"_id": 0})
+
+    def heartbeat(self, owner):
+        self.collection.update_many({"owner": owner, "status": {"$in": UNFINISHED}},
+                                    {"$set": {"heartbeat_at": datetime.datetime.utcnow()}})
+
+    def fail_stale(self, cutoff):
+        # Jobs left queued or running by a process that is gone would otherwise never finish
+        result = self.collection.update_many(
+            {"status": {"$in": UNFINISHED},
+             "$or": [{"heartbeat_at": {"$lt": cutoff}}, {"heartbeat_at": {"$exists": False}}]},
+            {"$set": {"status": "failed", "error": "Interrupted: the process running this job stopped",
+                      "finished_at": datetime.datetime.utcnow()}},
+        )
+        return result.modified_count
+
+
+# Minimum seconds between timing updates written to the job store while a job runs
+TIMING_FLUSH_INTERVAL = 0.5
+
+
+class Job:
+    """Handle given to a running task to report its progress."""
+
+    def __init__(self, store, job_id):
+        self.store = store
+        self.job_id = job_id
+        self.timings = {}
+        self._running = []  # Stack of [stage name, clock start]; only the innermost stage is timed
+        self._flushed_at = 0.0
+
+    @contextmanager
+    def stage(self, name):
+        # Time is exclusive: while a nested stage runs (e.g. a generator pulling from the
+        # stage before it), the outer stage's clock is paused
+        now = time.perf_counter()
+        if self._running:
+            self._charge(self._running[-1], now)
+        self._running.append([name, now])
+        try:
+            yield
+        finally:
+            now = time.perf_counter()
+            self._charge(self._running.pop(), now)
+            if self._running:
+                self._running[-1][1] = now
+            self.flush()
+
+    def timed(self, name, iterable):
+        # Wraps a generator so the time spent producing each item is charged to stage `name`
+        iterator = iter(iterable)
+        while True:
+            with self.stage(name):
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    return
+            yield item
+
+    def _charge(self, running, now):
+        name, start = running
+        self.timings[name] = self.timings.get(name, 0.0) + now - start
+
+    def flush(self, force=False):
+        now = time.perf_counter()
+        if force or now - self._flushed_at >= TIMING_FLUSH_INTERVAL:
+            self._flushed_at = now
+            stage = self._running[-1][0] if self._running else None
+            timings = {name: round(seconds, 4) for name, seconds in self.timings.items()}
+            self.store.update(self.job_id, {"stage": stage, "timings": timings})
+
+    def progress(self, done, total):
+        self.store.update(self.job_id, {"progress": {"done": done, "total": total}})
+
+    def report(self, **fields):
+        # Extra details for status polls, e.g. per-page extraction timings
+        self.store.update(self.job_id, fields)
+
+
+class JobQueue:
+    def __init__(self, store=None, workers=INGEST_WORKERS, heartbeat_interval=JOB_HEARTBEAT_INTERVAL,
+                 stale_after=JOB_STALE_AFTER):
+        self.store = store or MemoryJobStore()
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="ingest")
+        self.heartbeat_interval = heartbeat_interval
+        self.stale_after = stale_after
+        self.owner = None  # Set per process, as the queue may be created before a fork
+        self._monitor_lock = threading.Lock()
+
+    def start(self):
+        # Starts this process's heartbeat thread, which also fails jobs interrupted by an earlier
+        # restart. Called on first use in each process: a thread started before gunicorn forks
+        # wouldn't run in the workers
+        with self._monitor_lock:
+            if self.owner and self.owner.endswith(f":{os.getpid()}"):
+                return
+            self.owner = f"{uuid.uuid4().hex}:{os.getpid()}"
+        threading.Thread(target=self._monitor, name="job-heartbeat", daemon=True).start()
+
+    def _monitor(self):
+        # Keeps this process's unfinished jobs alive and fails those whose process stopped heartbeating
+        while True:
+            try:
+                self.store.heartbeat(self.owner)
+                cutoff = datetime.datetime.utcnow() - datetime.timedelta(seconds=self.stale_after)
+                failed = self.store.fail_stale(cutoff)
+                if failed:
+                    print(f"Marked {failed} interrupted job(s) as failed")
+            except Exception as e:
+                print(f"Error checking job heartbeats: {e}")
+            time.sleep(self.heartbeat_interval)
+
+    def submit(self, task, *args, **metadata):
+        # task(job, *args) runs on a worker; its return value becomes the job's result
+        self.start()
+        job_id = str(uuid.uuid4())
+        self.store.create(dict(
+            metadata,
+            job_id=job_id,
+            owner=self.owner,
+            heartbeat_at=datetime.datetime.utcnow(),
+            status="queued",
+            stage=None,
+            progress=None,
+            timings={},
+            result=None,
+            error=None,
+            created_at=datetime.datetime.utcnow(),
+        ))
+        self.executor.submit(self._run, job_id, task, args)
+        return job_id
+
+    def _run(self, job_id, task, args):
+        job = Job(self.store, job_id)
+        self.store.update(job_id, {"status": "running", "started_at": datetime.datetime.utcnow()})
+        try:
+            result = task(job, *args)
+            job.flush(force=True)
+            self.store.update(job_id, {"status": "done", "stage": None, "result": result,
+                                       "finished_at": datetime.datetime.utcnow()})
+        except Exception as e:
+            print(f"Job {job_id} failed: {e}")
+            job.flush(force=True)
+            self.store.update(job_id, {"status": "failed", "error": str(e),
+                                       "finished_at": datetime.datetime.utcnow()})
+
+    def get(self, job_id):
+        self.start()
+        return self.store.get(job_id)
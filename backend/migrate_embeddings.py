@@ -0,0 +1,55 @@
+# One-off migration: rewrite documents stored with float-list embeddings into the packed format.
+#
+# Old records keep every embedding twice (document_chunks[i].embedding and embeddings[i]) as BSON
+# doubles. This replaces `embeddings` with one BinData blob and drops the per-chunk copies.
+#
+# Usage: python migrate_embeddings.py [--dtype float32|float16|int8] [--batch-size 100] [--dry-run]
+import argparse
+
+from pymongo import MongoClient, UpdateOne
+
+from embedding_codec import EMBEDDING_DTYPE, SUPPORTED_DTYPES, decode_embeddings, encode_embeddings
+
+
+def packed_update(document, dtype):
+    embeddings = document.get("embeddings")
+    if not embeddings:
+        # Very old records may only have the per-chunk copies
+        embeddings = [chunk["embedding"] for chunk in document.get("document_chunks", []) if "embedding" in chunk]
+    return UpdateOne(
+        {"_id": document["_id"]},
+        {
+            "$set": {"embeddings": encode_embeddings(decode_embeddings(embeddings), dtype)},
+            "$unset": {"document_chunks.$[].embedding": ""},
+        },
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--mongo-uri", default="mongodb://localhost:27017/")
+    parser.add_argument("--dtype", choices=SUPPORTED_DTYPES, default=EMBEDDING_DTYPE)
+    parser.add_argument("--batch-size", type=int, default=100)
+    parser.add_argument("--dry-run", action="store_true")
+    args = parser.parse_args()
+
+    documents_collection = MongoClient(args.mongo_uri)["DocAssist"]["documents"]
+    legacy = {"$or": [{"embeddings": {"$type": "array"}}, {"document_chunks.embedding": {"$exists": True}}]}
+    print(f"{documents_collection.count_documents(legacy)} documents to migrate")
+    if args.dry_run:
+        return
+
+    migrated, batch = 0, []
+    for document in documents_collection.find(legacy, {"embeddings": 1, "document_chunks.embedding": 1}):
+        batch.append(packed_update(document, args.dtype))
+        if len(batch) >= args.batch_size:
+            migrated += documents_collection.bulk_write(batch, ordered=False).modified_count
+            batch = []
+            print(f"Migrated {migrated} documents...")
+    if batch:
+        migrated += documents_collection.bulk_write(batch, ordered=False).modified_count
+    print(f"Migrated {migrated} documents to packed {args.dtype} embeddings")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,173 @@
+import os
+import threading
+from multiprocessing.connection import Client
+
+import numpy as np
+
+# Address of the shared model server (model_server.py): a Unix socket path or host:port.
+# Unset: every app loads its own models in-process, as before.
+MODEL_SERVER = os.environ.get("DOCASSIST_MODEL_SERVER") or None
+
+# Shared secret for the connection handshake; must match the server's. Required for TCP addresses:
+# both ends unpickle what the other sends, so anyone able to connect could run code in them.
+# A Unix socket without one relies on the socket file's permissions (owner only) instead
+MODEL_SERVER_AUTHKEY = os.environ.get("DOCASSIST_MODEL_SERVER_AUTHKEY", "").encode("utf-8") or None
+
+EMBEDDING_MODEL = "all-MiniLM-L6-v2"
+SUMMARY_MODEL = "facebook/bart-large-cnn"
+
+
+class ModelServerError(RuntimeError):
+    pass
+
+
+def parse_address(address):
+    # "/path/to.sock" -> Unix socket, "host:port" -> TCP, ":port" -> TCP on localhost
+    if ":" in address and not address.startswith("/"):
+        host, port = address.rsplit(":", 1)
+        return host or "127.0.0.1", int(port)
+    return address
+
+
+def check_authkey(address, authkey):
+    # address as returned by parse_address
+    if not isinstance(address, str) and not authkey:
+        raise ModelServerError(f"Set DOCASSIST_MODEL_SERVER_AUTHKEY to use a TCP model server address ({address[0]}:{address[1]})")
+
+
+class ModelClient:
+    """Calls into the model server; one connection per calling thread, reopened if it drops."""
+
+    def __init__(self, address=MODEL_SERVER, authkey=MODEL_SERVER_AUTHKEY):
+        self.address = parse_address(address)
+        self.authkey = authkey
+        check_authkey(self.address, authkey)
+        self.local = threading.local()
+        self._info = None
+
+    def _connection(self):
+        if getattr(self.local, "connection", None) is None:
+            self.local.connection = Client(self.address, authkey=self.authkey)
+        return self.local.connection
+
+    def call(self, op, *args):
+        for attempt in range(2):
+            try:
+                connection = self._connection()
+                connection.send((op, args))
+                status, result = connection.recv()
+                break
+            except (EOFError, OSError):
+                # Server restarted or the connection went stale: reconnect once
+                self.local.connection = None
+                if attempt:
+                    raise
+        if status == "error":
+            raise ModelServerError(result)
+        return result
+
+    def call_stream(self, op, *args):
+        # Yields the server's ("chunk", ...) messages; returns its final result
+        connection = self._connection()
+        connection.send((op, args))
+        finished = False
+        try:
+            while True:
+                status, result = connection.recv()
+                if status == "chunk":
+                    yield result
+                elif status == "error":
+                    finished = True
+                    raise ModelServerError(result)
+                else:
+                    finished = True
+                    return result
+        finally:
+            if not finished:
+                # Abandoned mid-stream: the rest of it is still on this connection, so drop it
+                connection.close()
+                self.local.connection = None
+
+    def info(self):
+        if self._info is None:
+            self._info = self.call("info")
+        return self._info
+
+    def stats(self):
+        return self.call("stats")
+
+
+class RemoteEncoder:
+    """Stands in for the SentenceTransformer: encode() runs on the server, the tokenizer runs here."""
+
+    def __init__(self, client, model_name=EMBEDDING_MODEL, stats_key="encode"):
+        self.client = client
+        self.model_name = model_name
+        self.stats_key = stats_key  # Which of the server's encode batchers stats() reports
+        self._tokenizer = None
+
+    @property
+    def tokenizer(self):
+        # Only the tokenizer (a few MB) is loaded in the web process, for token-aware chunking
+        if self._tokenizer is None:
+            from transformers import AutoTokenizer
+            self._tokenizer = AutoTokenizer.from_pretrained(f"sentence-transformers/{self.model_name}")
+        return self._tokenizer
+
+    @property
+    def max_seq_length(self):
+        return self.client.info()["max_seq_length"]
+
+    def encode(self, texts):
+        if isinstance(texts, str):
+            return self.client.call("encode", texts)
+        return self.client.call("encode", list(texts))
+
+    def stats(self):
+        return self.client.stats()[self.stats_key]
+
+
+class RemoteGenerator:
+    """Stands in for model.generate() on a single input; batching happens on the server."""
+
+    def __init__(self, client, model_name=SUMMARY_MODEL):
+        self.client = client
+        self.model_name = model_name
+
+    def generate(self, input_ids, **params):
+        output_ids = self.client.call("generate", np.asarray(input_ids).tolist(), params, self.model_name)
+        return np.array(output_ids)
+
+    def generate_many(self, inputs, **params):
+        outputs = self.client.call("generate_many", [np.asarray(input_ids).tolist() for input_ids in inputs], params, self.model_name)
+        return [np.array(output_ids) for output_ids in outputs]
+
+    def stream(self, input_ids, **params):
+        output_ids = yield from self.client.call_stream("generate_stream", np.asarray(input_ids).tolist(), params, self.model_name)
+        return np.array(output_ids)
+
+    def stats(self):
+        return self.client.stats()["generate"].get(self.model_name, {})
+
+
+class RemoteSplitter:
+    """Sentence splitter running on the server, so web processes don't load spaCy."""
+
+    def __init__(self, client):
+        self.client = client
+
+    @property
+    def batch_size(self):
+        return self.client.info()["splitter_batch_size"]
+
+    @property
+    def max_length(self):
+        return self.client.info()["splitter_max_length"]
+
+    def split_many(self, texts):
+        return iter(self.client.call("split_many", list(texts)))
+
+
+def get_model_client():
+    # None when no model server is configured
+    return ModelClient(MODEL_SERVER) if MODEL_SERVER else None
@@ -0,0 +1,137 @@
+import os
+import threading
+import time
+
+from chunking import get_splitter
+from inference import ENCODE_BATCH_SIZE, INGEST_MAX_BATCH, BatchedEncoder, BatchedGenerator
+from inference_backends import load_encoder, load_summarizer
+from model_client import SUMMARY_MODEL, RemoteEncoder, RemoteGenerator, RemoteSplitter
+
+# When models load: "background" (a warm-up thread right after startup, first use waits for it),
+# "lazy" (on first use only) or "eager" (at import, e.g. gunicorn preload so workers share them)
+MODEL_WARMUP = os.environ.get("DOCASSIST_MODEL_WARMUP", "background")
+
+
+class LazyModel:
+    """A model loaded once, on first use, by whichever thread needs it first.
+
+    Attribute access is forwarded to the loaded object, so a LazyModel can stand in for the
+    model itself (lazy.encode(...), lazy.tokenizer); that first access blocks until it's loaded.
+    """
+
+    def __init__(self, name, loader):
+        self._name = name
+        self._loader = loader
+        self._lock = threading.Lock()
+        self._value = None
+        self._loaded = False
+        self._error = None
+        self._seconds = None
+
+    def get(self):
+        if not self._loaded:
+            with self._lock:
+                if not self._loaded:
+                    start = time.perf_counter()
+                    try:
+                        self._value = self._loader()
+                    except Exception as e:
+                        self._error = f"{type(e).__name__}: {e}"
+                        raise
+                    self._seconds = round(time.perf_counter() - start, 2)
+                    self._error = None
+                    self._loaded = True
+        return self._value
+
+    def __getattr__(self, name):
+        return getattr(self.get(), name)
+
+    @property
+    def loaded(self):
+        return self._loaded
+
+    def status(self):
+        return {"loaded": self._loaded, "load_seconds": self._seconds, "error": self._error}
+
+
+class ModelRegistry:
+    """The models an app needs, their load state, and warm-up."""
+
+    def __init__(self):
+        self.models = {}
+        self.optional = set()  # Loaded on first use only; not needed for readiness
+
+    def register(self, name, loader, optional=False):
+        self.models[name] = LazyModel(name, loader)
+        if optional:
+            self.optional.add(name)
+        return self.models[name]
+
+    def load_all(self):
+        for name, model in list(self.models.items()):
+            if name in self.optional:
+                continue
+            try:
+                model.get()
+            except Exception as e:
+                print(f"Error loading model: {e}")  # Reported by status(); retried on next use
+
+    def warm_up(self, mode=MODEL_WARMUP):
+        if mode == "eager":
+            self.load_all()
+        elif mode == "background":
+            threading.Thread(target=self.load_all, name="model-warmup", daemon=True).start()
+
+    def ready(self):
+        return all(model.loaded for name, model in self.models.items() if name not in self.optional)
+
+    def status(self):
+        return {name: model.status() for name, model in self.models.items()}
+
+
+def load_bart_tokenizer(model_name=SUMMARY_MODEL):
+    from transformers import BartTokenizer
+    return BartTokenizer.from_pretrained(model_name)
+
+
+def load_bart_model():
+    return load_summarizer()  # Backend set by DOCASSIST_SUMMARIZER_BACKEND / DOCASSIST_INFERENCE_BACKEND
+
+
+def load_bert_model():
+    return load_encoder()  # Backend set by DOCASSIST_ENCODER_BACKEND / DOCASSIST_INFERENCE_BACKEND
+
+
+def register_summarizer(registry, model_client, model_name, optional=True):
+    # (tokenizer, generator) for another summarization model, e.g. a distilled one for fast modes
+    tokenizer = registry.register(f"{model_name} tokenizer", lambda: load_bart_tokenizer(model_name), optional)
+    if model_client:
+        return tokenizer, RemoteGenerator(model_client, model_name)
+    model = registry.register(model_name, lambda: load_summarizer(model_name=model_name), optional)
+    return tokenizer, BatchedGenerator(model, tokenizer)
+
+
+def register_models(registry, model_client=None):
+    """Registers what the web apps use and returns stand-ins for it, none of them loaded yet:
+    (bert_model, query_encoder, chunk_encoder, bart_tokenizer, bart_generator, sentence_splitter).
+
+    With a model_client the models live in the shared model server and only the tokenizers
+    load here; otherwise everything loads in-process.
+    """
+    bart_tokenizer = registry.register("bart_tokenizer", load_bart_tokenizer)
+    if model_client:
+        registry.register("model_server", model_client.info)
+        # The server batches concurrent queries, and concurrent uploads' chunks
+        bert_model = query_encoder = RemoteEncoder(model_client)
+        chunk_encoder = RemoteEncoder(model_client, stats_key="encode_chunks")
+        registry.register("embedding_tokenizer", lambda: bert_model.tokenizer)
+        return (bert_model, query_encoder, chunk_encoder, bart_tokenizer, RemoteGenerator(model_client),
+                RemoteSplitter(model_client))
+
+    bert_model = registry.register("embedding", load_bert_model)
+    bart_model = registry.register("summarization", load_bart_model)
+    sentence_splitter = registry.register("sentence_splitter", get_splitter)  # DOCASSIST_SENTENCE_SPLITTER
+    # Request threads queue their queries, chunks and summaries here and share batched forward passes
+    chunk_encoder = BatchedEncoder(bert_model, INGEST_MAX_BATCH, forward_batch_size=ENCODE_BATCH_SIZE, name="ingest-batcher")
+    return (bert_model, BatchedEncoder(bert_model), chunk_encoder, bart_tokenizer, BatchedGenerator(bart_model, bart_tokenizer),
+            sentence_splitter)
@@ -0,0 +1,138 @@
+# Shared model server: loads BART, MiniLM and the sentence splitter once per host and serves
+# them to every web app and worker over a local socket (see model_client.py)
+#
+# Usage: DOCASSIST_MODEL_SERVER=/tmp/docassist-models.sock python backend/model_server.py
+#        (a host:port address also needs DOCASSIST_MODEL_SERVER_AUTHKEY, set the same for the apps)
+import argparse
+import os
+import threading
+from multiprocessing.connection import Listener
+
+import numpy as np
+
+from chunking import get_splitter
+from inference import ENCODE_BATCH_SIZE, INGEST_MAX_BATCH, BatchedEncoder, BatchedGenerator
+from model_client import EMBEDDING_MODEL, MODEL_SERVER, MODEL_SERVER_AUTHKEY, SUMMARY_MODEL, check_authkey, parse_address
+from inference_backends import load_summarizer
+from model_registry import load_bart_model, load_bart_tokenizer, load_bert_model
+
+DEFAULT_ADDRESS = "/tmp/docassist-models.sock"
+
+
+class ModelServer:
+    """Answers encode / generate / split requests; one thread per client connection."""
+
+    def __init__(self):
+        self.bert_model = load_bert_model()
+        self.splitter = get_splitter()
+        # Requests from every web worker on the host now share one batching scheduler per model
+        self.query_encoder = BatchedEncoder(self.bert_model)
+        self.chunk_encoder = BatchedEncoder(self.bert_model, INGEST_MAX_BATCH, forward_batch_size=ENCODE_BATCH_SIZE,
+                                            name="ingest-batcher")
+        self.generators = {SUMMARY_MODEL: BatchedGenerator(load_bart_model(), load_bart_tokenizer())}
+        self.generators_lock = threading.Lock()
+        self.handlers = {
+            "info": self.info,
+            "encode": self.encode,
+            "generate": self.generate,
+            "generate_many": self.generate_many,
+            "split_many": self.split_many,
+            "stats": self.stats,
+        }
+        # Ops answered with a series of ("chunk", ...) messages before the final result
+        self.stream_handlers = {
+            "generate_stream": self.generate_stream,
+        }
+
+    def info(self):
+        return {"embedding_model": EMBEDDING_MODEL, "max_seq_length": self.bert_model.max_seq_length,
+                "splitter_batch_size": self.splitter.batch_size, "splitter_max_length": self.splitter.max_length}
+
+    def encode(self, texts):
+        # Single queries and lists of chunks (ingestion) each have their own batching scheduler
+        if isinstance(texts, str):
+            return self.query_encoder.encode(texts)
+        return self.chunk_encoder.encode(texts)
+
+    def generator(self, model_name):
+        # Other summarizers (e.g. the distilled one) load on their first request
+        with self.generators_lock:
+            if model_name not in self.generators:
+                self.generators[model_name] = BatchedGenerator(load_summarizer(model_name=model_name),
+                                                               load_bart_tokenizer(model_name))
+            return self.generators[model_name]
+
+    def generate(self, input_ids, params, model_name=SUMMARY_MODEL):
+        return self.generator(model_name).generate(np.asarray(input_ids), **params).tolist()
+
+    def generate_many(self, inputs, params, model_name=SUMMARY_MODEL):
+        outputs = self.generator(model_name).generate_many([np.asarray(input_ids) for input_ids in inputs], **params)
+        return [output_ids.tolist() for output_ids in outputs]
+
+    def generate_stream(self, input_ids, params, model_name=SUMMARY_MODEL):
+        output_ids = yield from self.generator(model_name).stream(np.asarray(input_ids), **params)
+        return output_ids.tolist()
+
+    def split_many(self, texts):
+        return list(self.splitter.split_many(texts))
+
+    def stats(self):
+        with self.generators_lock:
+            generators = dict(self.generators)
+        return {"encode": self.query_encoder.stats(), "encode_chunks": self.chunk_encoder.stats(),
+                "generate": {model_name: generator.stats() for model_name, generator in generators.items()}}
+
+    def handle(self, connection):
+        with connection:
+            while True:
+                try:
+                    op, args = connection.recv()
+                except (EOFError, OSError):
+                    return  # Client went away
+                try:
+                    if op in self.stream_handlers:
+                        stream = self.stream_handlers[op](*args)
+                        while True:
+                            try:
+                                connection.send(("chunk", next(stream)))
+                            except StopIteration as stop:
+                                connection.send(("ok", stop.value))
+                                break
+                    else:
+                        connection.send(("ok", self.handlers[op](*args)))
+                except (EOFError, OSError):
+                    return  # Client went away mid-stream
+                except Exception as e:
+                    connection.send(("error", f"{type(e).__name__}: {e}"))
+
+    def serve(self, address=MODEL_SERVER or DEFAULT_ADDRESS, authkey=MODEL_SERVER_AUTHKEY):
+        address = parse_address(address)
+        check_authkey(address, authkey)  # Refuse to start a TCP listener anyone could call unauthenticated
+        if isinstance(address, str) and os.path.exists(address):
+            os.remove(address)  # Stale socket from a previous run
+        umask = os.umask(0o177)  # A new Unix socket is only connectable by this user
+        try:
+            listener = Listener(address, authkey=authkey)
+        finally:
+            os.umask(umask)
+        with listener:
+            print(f"Model server listening on {address}")
+            while True:
+                try:
+                    connection = listener.accept()
+                except Exception as e:
+                    print(f"Rejected model server connection: {e}")
+                    continue
+                threading.Thread(target=self.handle, args=(connection,), daemon=True).start()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--address", default=MODEL_SERVER or DEFAULT_ADDRESS)
+    args = parser.parse_args()
+    check_authkey(parse_address(args.address), MODEL_SERVER_AUTHKEY)  # Before spending time loading models
+    ModelServer().serve(args.address)
+
+
+if __name__ == "__main__":
+    main()
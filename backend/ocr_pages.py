@@ -0,0 +1,166 @@
+import hashlib
+import io
+import os
+import threading
+import time
+
+# Resolution scanned PDF pages are rasterized at; Tesseract reads ~300 DPI best, lower is faster but loses small print
+OCR_DPI = int(os.environ.get("DOCASSIST_OCR_DPI", 300))
+
+# Tesseract language(s), e.g. "eng+deu"
+OCR_LANG = os.environ.get("DOCASSIST_OCR_LANG", "eng")
+
+# Set to 0 where Tesseract isn't installed: pages without a text layer then stay empty
+OCR_ENABLED = os.environ.get("DOCASSIST_OCR", "1") != "0"
+
+# PDF pages whose text layer has fewer characters than this are OCR'd (scans, or scans with a
+# stamped page number); every other page is digital and never rasterized
+OCR_MIN_CHARS = int(os.environ.get("DOCASSIST_OCR_MIN_CHARS", 20))
+
+# OCR text per page image, shared by every extraction process (empty: no cache)
+OCR_CACHE_DIR = os.environ.get("DOCASSIST_OCR_CACHE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "ocr_cache"))
+
+# Files kept in OCR_CACHE_DIR; the least recently used are removed beyond this
+OCR_CACHE_ENTRIES = int(os.environ.get("DOCASSIST_OCR_CACHE_ENTRIES", 50_000))
+
+# Writes (per process) between two trims of the cache directory
+_PRUNE_EVERY = 100
+
+# Uploads that are OCR'd as a whole; a multi-page TIFF gives one page per frame
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".tif", ".tiff")
+
+
+def needs_ocr(text, min_chars=OCR_MIN_CHARS):
+    return OCR_ENABLED and len(text.strip()) < min_chars
+
+
+def image_key(image):
+    # Same pixels, same OCR settings: same text. A re-uploaded scan rasterizes to identical pixels
+    digest = hashlib.sha256()
+    digest.update(f"{OCR_LANG}|{image.mode}|{image.size}".encode("utf-8"))
+    digest.update(image.tobytes())
+    return digest.hexdigest()
+
+
+class OcrCache:
+    """OCR text per page image hash, as one file per page in a directory shared by all processes."""
+
+    def __init__(self, directory=OCR_CACHE_DIR, max_entries=OCR_CACHE_ENTRIES):
+        self.directory = directory or None
+        self.max_entries = max_entries
+        self.lock = threading.Lock()
+        self.writes = 0
+        if self.directory:
+            os.makedirs(self.directory, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.directory, key + ".txt")
+
+    def get(self, key):
+        if not self.directory:
+            return None
+        try:
+            with open(self._path(key), encoding="utf-8") as f:
+                text = f.read()
+            os.utime(self._path(key))  # Recently used: kept longest when trimming
+            return text
+        except OSError:
+            return None
+
+    def put(self, key, text):
+        if not self.directory:
+            return
+        tmp_path = f"{self._path(key)}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                f.write(text)
+            os.replace(tmp_path, self._path(key))
+        except OSError as e:
+            print(f"Error writing OCR cache: {e}")
+            return
+        with self.lock:
+            self.writes += 1
+            prune = self.writes % _PRUNE_EVERY == 0
+        if prune:
+            self._prune()
+
+    def _entries(self):
+        entries = []
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith(".txt"):
+                try:
+                    stat = entry.stat()
+                    entries.append((stat.st_mtime, stat.st_size, entry.path))
+                except OSError:
+                    pass  # Removed by another process meanwhile
+        return entries
+
+    def _prune(self):
+        entries = sorted(self._entries())
+        for mtime, size, path in entries[:max(0, len(entries) - self.max_entries)]:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def stats(self):
+        # Read from the directory, since hits happen in the extraction processes
+        entries = self._entries() if self.directory else []
+        return {"directory": self.directory, "entries": len(entries), "bytes": sum(size for mtime, size, path in entries),
+                "max_entries": self.max_entries}
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_ocr_cache():
+    # One per process (each extraction worker opens its own on the shared directory)
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = OcrCache()
+        return _cache
+
+
+# pytesseract and Pillow are imported where they're used, like the other extractors: only the
+# extraction processes need them
+def ocr_image(image):
+    # Tesseract reads grayscale; hashing that is also a third of the bytes of RGB
+    image = image.convert("L")
+    key = image_key(image)
+    text = get_ocr_cache().get(key)
+    if text is None:
+        import pytesseract
+
+        text = pytesseract.image_to_string(image, lang=OCR_LANG)
+        get_ocr_cache().put(key, text)
+    return text
+
+
+def ocr_pdf_page(page, dpi=OCR_DPI):
+    # page: a pdfplumber page with too little text layer, rasterized (pypdfium2) and OCR'd
+    return ocr_image(page.to_image(resolution=dpi).original)
+
+
+def ocr_image_file(data):
+    # Runs in a worker process: [(page_number, text, seconds), ...], one page per image frame.
+    # A corrupt or unreadable image gives the frames decoded before the error (none if it can't be
+    # opened), like a PDF page that fails, instead of failing the whole upload
+    from PIL import Image, ImageSequence
+
+    pages = []
+    try:
+        with Image.open(io.BytesIO(data)) as image:
+            for number, frame in enumerate(ImageSequence.Iterator(image)):
+                start = time.perf_counter()
+                try:
+                    text = ocr_image(frame)
+                except Exception as e:
+                    print(f"Error running OCR on image page {number + 1}: {str(e)}")
+                    text = ""
+                pages.append((number, text, time.perf_counter() - start))
+    except Exception as e:
+        # UnidentifiedImageError/OSError, but Pillow raises TypeError or SyntaxError for some corrupt frames
+        print(f"Error reading image: {str(e)}")
+    return pages
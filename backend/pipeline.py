@@ -0,0 +1,125 @@
+import os
+import re
+from itertools import groupby
+
+# Text handed to the sentence splitter at once; well below spaCy's max_length of 1,000,000
+SEGMENT_CHARS = int(os.environ.get("DOCASSIST_SEGMENT_CHARS", 20_000))
+
+# Pages ending like this finish a sentence, so a segment may be closed after them
+SENTENCE_END = re.compile(r"""[.!?]["')\]]*$""")
+SENTENCE_BREAK = re.compile(r"""[.!?]["')\]]*\s""")
+
+# Chunks embedded and stored together
+EMBED_BATCH_SIZE = int(os.environ.get("DOCASSIST_EMBED_BATCH_SIZE", 256))
+
+MAX_CHUNK_SIZE = 512
+
+
+def clean_text(text):
+    return re.sub(r"\s+", " ", text).strip()
+
+
+def track_pages(pages, stats):
+    # Passes pages through while keeping running per-page extraction stats
+    for page in pages:
+        file_index, page_number, text, seconds = page
+        stats["pages"] = stats.get("pages", 0) + 1
+        stats["seconds"] = round(stats.get("seconds", 0.0) + seconds, 4)
+        if seconds > stats.get("slowest_page_seconds", 0.0):
+            stats["slowest_page"] = {"file": file_index, "page": page_number + 1}
+            stats["slowest_page_seconds"] = round(seconds, 4)
+        yield page
+
+
+def iter_file_texts(pages):
+    # pages (from extraction.iter_pages) -> (file_index, cleaned text), one piece per page.
+    # Every later stage keeps the file_index, so no sentence or chunk spans two files.
+    for file_index, page_number, text, seconds in pages:
+        cleaned = clean_text(text)
+        if cleaned:
+            yield file_index, cleaned
+
+
+def _cut_point(text, limit):
+    # Where to break an over-long text at or before limit: after a sentence end if there is one
+    last = None
+    for last in SENTENCE_BREAK.finditer(text, 0, limit):
+        pass
+    if last is not None:
+        return last.end()
+    space = text.rfind(" ", 0, limit)
+    return space + 1 if space > 0 else limit
+
+
+def iter_segments(texts, segment_chars=SEGMENT_CHARS, max_chars=None):
+    """Group a stream of (file_index, text) pieces into segments that can be sentence-split independently.
+
+    A segment only ends where a piece ends with sentence-final punctuation (or where the file
+    changes), so a sentence running across two pages stays in one segment. Past max_chars (the
+    splitter's limit) a segment is closed regardless.
+    """
+    max_chars = max_chars or 4 * segment_chars
+    pieces, length, current_file = [], 0, None
+    for file_index, text in texts:
+        if pieces and (file_index != current_file or length + len(text) > max_chars):
+            yield current_file, " ".join(pieces)
+            pieces, length = [], 0
+        current_file = file_index
+        while len(text) > max_chars:
+            # One piece (e.g. a whole .txt file) longer than a segment may be: cut it up
+            cut = _cut_point(text, segment_chars)
+            yield file_index, text[:cut].strip()
+            text = text[cut:].lstrip()
+        pieces.append(text)
+        length += len(text) + 1
+        if length >= segment_chars and SENTENCE_END.search(text):
+            yield file_index, " ".join(pieces)
+            pieces, length = [], 0
+    if pieces:
+        yield current_file, " ".join(pieces)
+
+
+def iter_sentences(texts, splitter, segment_chars=SEGMENT_CHARS):
+    # (file_index, text) pieces -> (file_index, sentence). Segments are independent, so several
+    # go through the splitter per call (nlp.pipe batching)
+    segments = iter_segments(texts, segment_chars, min(4 * segment_chars, splitter.max_length // 2))
+    for batch in iter_batches(segments, splitter.batch_size):
+        for (file_index, segment), sentences in zip(batch, splitter.split_many([text for _, text in batch])):
+            for sentence in sentences:
+                yield file_index, sentence
+
+
+def per_file(chunker, sentences, *args, **kwargs):
+    # Runs a chunker over (file_index, sentence) pairs one file at a time -> (file_index, chunk)
+    for file_index, group in groupby(sentences, key=lambda pair: pair[0]):
+        for chunk in chunker((sentence for _, sentence in group), *args, **kwargs):
+            yield file_index, chunk
+
+
+def iter_chunks(sentences, max_chunk_size=MAX_CHUNK_SIZE):
+    # Packs sentences greedily into chunks of at most max_chunk_size characters (same rule as
+    # split_into_chunks), collecting parts in a list instead of growing one string
+    parts, length = [], 0
+    for sentence in sentences:
+        if parts and length + len(sentence) <= max_chunk_size:
+            parts.append(sentence)
+            length += 1 + len(sentence)
+        elif not parts and len(sentence) <= max_chunk_size:
+            parts, length = [sentence], 1 + len(sentence)
+        else:
+            if parts:
+                yield " ".join(parts).strip()
+            parts, length = [sentence], len(sentence)
+    if parts:
+        yield " ".join(parts).strip()
+
+
+def iter_batches(items, batch_size=EMBED_BATCH_SIZE):
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
@@ -0,0 +1,49 @@
+import os
+
+from cache import LRUCache
+from pipeline import clean_text
+
+# Query embeddings kept per process, and for how long (seconds)
+QUERY_CACHE_SIZE = int(os.environ.get("DOCASSIST_QUERY_CACHE_SIZE", 10_000))
+QUERY_CACHE_TTL = float(os.environ.get("DOCASSIST_QUERY_CACHE_TTL", 3600))
+
+# Top-k retrieval results kept per process, and for how long (seconds)
+RESULT_CACHE_SIZE = int(os.environ.get("DOCASSIST_RESULT_CACHE_SIZE", 10_000))
+RESULT_CACHE_TTL = float(os.environ.get("DOCASSIST_RESULT_CACHE_TTL", 600))
+
+
+class QueryCache:
+    """Query embeddings and top-k results for repeated (document, query) pairs."""
+
+    def __init__(self, encode, query_size=QUERY_CACHE_SIZE, query_ttl=QUERY_CACHE_TTL,
+                 result_size=RESULT_CACHE_SIZE, result_ttl=RESULT_CACHE_TTL):
+        self.encode_fn = encode  # encode(text) -> (dim,) array
+        self.queries = LRUCache(query_size, query_ttl)
+        self.results = LRUCache(result_size, result_ttl)
+
+    def embed(self, query):
+        key = clean_text(query)
+        embedding = self.queries.get(key)
+        if embedding is None:
+            embedding = self.encode_fn(key)  # What the key stands for, whatever the spacing of this query
+            self.queries.put(key, embedding)
+        return embedding
+
+    def search(self, scope, query, k, search, version=None):
+        # scope names what was searched (a document id, a user's library); search(embedding, k) runs on a miss.
+        # version (e.g. VectorIndex.version()) changes when the scope is updated, also by another
+        # worker process whose invalidate() never reaches this one
+        key = (scope, clean_text(query), k, version)
+        results = self.results.get(key)
+        if results is None:
+            results = search(self.embed(query), k)
+            self.results.put(key, results)
+        return results
+
+    def invalidate(self, scope):
+        # Called when what scope covers changes, e.g. a document is re-processed or deleted.
+        # Only clears this process: other workers rely on the version passed to search()
+        return self.results.remove_where(lambda key: key[0] == scope)
+
+    def stats(self):
+        return {"queries": self.queries.stats(), "results": self.results.stats()}
@@ -0,0 +1,71 @@
+import numpy as np
+
+# Number of chunks returned by a search when the caller does not ask for more
+DEFAULT_TOP_K = 3
+
+# Most chunks a request may ask for; larger values are clamped, as they size the search's result buffers
+MAX_TOP_K = 100
+
+
+def normalize_embeddings(embeddings):
+    # Copy into one contiguous float32 matrix and scale every row to unit length,
+    # so cosine similarity becomes a plain dot product at query time
+    matrix = np.array(embeddings, dtype=np.float32, order="C", copy=True)
+    if matrix.ndim == 1:
+        matrix = matrix.reshape(1, -1) if matrix.size else matrix.reshape(0, 0)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    matrix /= norms
+    return matrix
+
+
+def parse_top_k(value, default=DEFAULT_TOP_K, max_k=MAX_TOP_K):
+    # A client-supplied top_k clamped to 1..max_k; None if it isn't a whole number
+    if value is None:
+        return default
+    try:
+        k = int(value)
+    except (TypeError, ValueError, OverflowError):
+        return None
+    return min(max(k, 1), max_k)
+
+
+def top_k_indices(scores, k=DEFAULT_TOP_K):
+    # Partial sort: argpartition picks the k best in O(n), only those k get fully sorted
+    k = min(int(k), len(scores))
+    if k <= 0:
+        return np.empty(0, dtype=np.int64)
+    if k < len(scores):
+        candidates = np.argpartition(-scores, k - 1)[:k]
+    else:
+        candidates = np.arange(len(scores))
+    return candidates[np.argsort(-scores[candidates], kind="stable")]
+
+
+class EmbeddingMatrix:
+    """Pre-normalized float32 embeddings of one document, searchable by cosine similarity."""
+
+    def __init__(self, embeddings):
+        self.matrix = normalize_embeddings(embeddings)
+
+    def __len__(self):
+        return self.matrix.shape[0]
+
+    def scores(self, query_embedding):
+        if len(self) == 0:
+            return np.empty(0, dtype=np.float32)
+        query = normalize_embeddings(query_embedding)[0]
+        return self.matrix @ query
+
+    def search(self, query_embedding, k=DEFAULT_TOP_K):
+        # Returns [(chunk_index, score), ...] best first
+        scores = self.scores(query_embedding)
+        return [(int(i), float(scores[i])) for i in top_k_indices(scores, k)]
+
+
+def search_chunks(query_embedding, document_chunks, k=DEFAULT_TOP_K):
+    # Convenience for callers holding chunks as [{"text": ..., "embedding": [...]}, ...]
+    if not document_chunks:
+        return []
+    matrix = EmbeddingMatrix([chunk["embedding"] for chunk in document_chunks])
+    return [(document_chunks[i], score) for i, score in matrix.search(query_embedding, k)]
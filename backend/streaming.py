@@ -0,0 +1,30 @@
+import json
+
+# Server-Sent Events responses: never cached, and not buffered by reverse proxies (nginx honours X-Accel-Buffering)
+SSE_HEADERS = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+
+
+def sse(event, data):
+    # One Server-Sent Event carrying a JSON payload
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+def bullet_points(pieces):
+    """Streamed summary text as ("token", text) events, plus a ("bullet", sentence) event per sentence.
+
+    Sentences are split on ". " and deduplicated, like the non-streaming answers' bullet points;
+    each is emitted as soon as the text after it starts arriving, the last one at the end.
+    """
+    buffer, seen = "", set()
+    for piece in pieces:
+        yield "token", piece
+        buffer += piece
+        *sentences, buffer = buffer.split(". ")
+        for sentence in sentences:
+            sentence = sentence.strip()
+            if sentence and sentence not in seen:
+                seen.add(sentence)
+                yield "bullet", sentence
+    buffer = buffer.strip()
+    if buffer and buffer not in seen:
+        yield "bullet", buffer
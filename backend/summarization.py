@@ -0,0 +1,93 @@
+import os
+
+from model_client import SUMMARY_MODEL
+from retrieval import normalize_embeddings, top_k_indices
+from summary_cache import SummaryCache
+
+# Smaller summarizer for the "distilled" mode (12 encoder / 6 decoder layers instead of 12 / 12)
+DISTILLED_SUMMARY_MODEL = os.environ.get("DOCASSIST_DISTILLED_SUMMARY_MODEL", "sshleifer/distilbart-cnn-12-6")
+
+# Generation profiles, chosen per request with "mode". "beam" is the original setting; the others
+# trade summary length and search width for latency, down to "extractive", which runs no decoder
+SUMMARY_MODES = {
+    "beam": {"model": SUMMARY_MODEL,
+             "params": dict(max_length=300, min_length=100, length_penalty=2.0, num_beams=4, early_stopping=True)},
+    "greedy": {"model": SUMMARY_MODEL, "params": dict(max_length=120, min_length=30, num_beams=1)},
+    "distilled": {"model": DISTILLED_SUMMARY_MODEL, "params": dict(max_length=120, min_length=30, num_beams=1)},
+    "extractive": {"sentences": 3},
+}
+
+DEFAULT_SUMMARY_MODE = os.environ.get("DOCASSIST_SUMMARY_MODE", "beam")
+
+# Longest input the BART summarizers accept, in tokens
+MAX_INPUT_TOKENS = 1024
+
+
+class Summarizer:
+    """Summaries of one or more texts in any of SUMMARY_MODES.
+
+    Generating modes tokenize every text of a request and decode them as one batch (through the
+    summary cache, so repeated contexts skip generation). The extractive mode keeps the sentences
+    closest to the query, or to the text's own centroid without one, in their original order.
+    """
+
+    def __init__(self, summarizers, encode, splitter, default_mode=DEFAULT_SUMMARY_MODE):
+        self.summarizers = summarizers  # model name -> (tokenizer, generator with generate_many)
+        self.caches = {model_name: SummaryCache(model_name) for model_name in summarizers}
+        self.encode = encode  # encode(list_of_texts) -> (n, dim) embeddings
+        self.splitter = splitter
+        self.default_mode = default_mode
+
+    def summarize(self, texts, mode=None, query_embedding=None):
+        mode = mode or self.default_mode
+        if mode not in SUMMARY_MODES:
+            raise ValueError(f"Unknown summary mode: {mode}")
+        profile = SUMMARY_MODES[mode]
+        if mode == "extractive":
+            return self._extract(texts, query_embedding, profile["sentences"])
+
+        tokenizer, generator = self.summarizers[profile["model"]]
+        inputs = [tokenizer.encode(text, return_tensors="pt", max_length=MAX_INPUT_TOKENS, truncation=True) for text in texts]
+        outputs = self.caches[profile["model"]].generate_many(generator, inputs, **profile["params"])
+        return [tokenizer.decode(output_ids[0], skip_special_tokens=True) for output_ids in outputs]
+
+    def stream(self, text, mode=None, query_embedding=None):
+        """Summary of one text as successive pieces of text, for streaming responses.
+
+        Greedy modes yield tokens as they're decoded. Beam search (whose best sequence is only
+        known at the end), the extractive mode and cached summaries yield the whole summary once.
+        """
+        mode = mode or self.default_mode
+        if mode not in SUMMARY_MODES:
+            raise ValueError(f"Unknown summary mode: {mode}")
+        profile = SUMMARY_MODES[mode]
+        if mode == "extractive" or profile["params"].get("num_beams", 1) > 1:
+            yield from self.summarize([text], mode, query_embedding)
+            return
+
+        tokenizer, generator = self.summarizers[profile["model"]]
+        input_ids = tokenizer.encode(text, return_tensors="pt", max_length=MAX_INPUT_TOKENS, truncation=True)
+        decode = lambda output_ids: tokenizer.decode(output_ids[0], skip_special_tokens=True)
+        yield from self.caches[profile["model"]].stream(generator, input_ids, decode, **profile["params"])
+
+    def _extract(self, texts, query_embedding, count):
+        per_text = [[sentence for sentence in sentences if sentence] for sentences in self.splitter.split_many(list(texts))]
+        # One encode call for the sentences of every text
+        all_sentences = [sentence for sentences in per_text for sentence in sentences]
+        embeddings = normalize_embeddings(self.encode(all_sentences)) if all_sentences else None
+
+        summaries, offset = [], 0
+        for sentences in per_text:
+            if len(sentences) <= count:
+                summaries.append(" ".join(sentences))
+            else:
+                rows = embeddings[offset:offset + len(sentences)]
+                target = query_embedding if query_embedding is not None else rows.mean(axis=0)
+                scores = rows @ normalize_embeddings(target)[0]
+                keep = sorted(top_k_indices(scores, count))
+                summaries.append(" ".join(sentences[i] for i in keep))
+            offset += len(sentences)
+        return summaries
+
+    def stats(self):
+        return {model_name: cache.stats() for model_name, cache in self.caches.items()}
@@ -0,0 +1,149 @@
+import hashlib
+import json
+import os
+import threading
+
+import numpy as np
+
+from cache import LRUCache
+from inference_backends import SUMMARIZER_BACKEND
+
+# Generations kept in process memory
+SUMMARY_CACHE_SIZE = int(os.environ.get("DOCASSIST_SUMMARY_CACHE_SIZE", 1000))
+
+# Optional directory that keeps generations across restarts and worker processes (unset: memory only)
+SUMMARY_CACHE_DIR = os.environ.get("DOCASSIST_SUMMARY_CACHE_DIR") or None
+
+# Files kept in SUMMARY_CACHE_DIR; the least recently used are removed beyond this
+SUMMARY_CACHE_DISK_ENTRIES = int(os.environ.get("DOCASSIST_SUMMARY_CACHE_DISK_ENTRIES", 10_000))
+
+# Writes between two trims of the disk tier
+_PRUNE_EVERY = 100
+
+
+def generation_key(model_name, input_ids, params, backend=SUMMARIZER_BACKEND):
+    # Same model and backend, same decoding parameters and same input tokens: same output
+    # (generation is deterministic here, but int8/ONNX may pick different tokens than fp32)
+    digest = hashlib.sha256()
+    digest.update(f"{model_name}\0{backend}".encode("utf-8"))
+    digest.update(json.dumps(params, sort_keys=True, default=str).encode("utf-8"))
+    digest.update(np.asarray(input_ids, dtype=np.int64).tobytes())
+    return digest.hexdigest()
+
+
+class SummaryCache:
+    """Output token ids of model.generate() per (model, generation params, input ids)."""
+
+    def __init__(self, model_name, memory_size=SUMMARY_CACHE_SIZE, directory=SUMMARY_CACHE_DIR,
+                 disk_entries=SUMMARY_CACHE_DISK_ENTRIES, backend=SUMMARIZER_BACKEND):
+        self.model_name = model_name
+        self.backend = backend
+        self.memory = LRUCache(memory_size)
+        self.directory = directory
+        self.disk_entries = disk_entries
+        self.lock = threading.Lock()
+        self.counts = {"disk_hits": 0, "generated": 0}
+        self.writes = 0
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def generate(self, model, input_ids, **params):
+        # Drop-in for model.generate(input_ids, **params); returns the output ids as lists
+        key = generation_key(self.model_name, input_ids, params, self.backend)
+        output_ids = self._lookup(key)
+        if output_ids is None:
+            output_ids = model.generate(input_ids, **params).tolist()
+            self._store(key, output_ids)
+        return output_ids
+
+    def generate_many(self, model, inputs, **params):
+        # Several inputs at once: only the ones not cached go to model.generate_many, in one batch
+        keys = [generation_key(self.model_name, input_ids, params, self.backend) for input_ids in inputs]
+        outputs = {key: self._lookup(key) for key in set(keys)}
+        missing = {key: input_ids for key, input_ids in zip(keys, inputs) if outputs[key] is None}
+        if missing:
+            for key, output_ids in zip(missing, model.generate_many(list(missing.values()), **params)):
+                outputs[key] = output_ids.tolist()
+                self._store(key, outputs[key])
+        return [outputs[key] for key in keys]
+
+    def stream(self, model, input_ids, decode, **params):
+        # Streaming counterpart of generate(): yields model.stream()'s text pieces, or decode(output_ids) once when cached
+        key = generation_key(self.model_name, input_ids, params, self.backend)
+        output_ids = self._lookup(key)
+        if output_ids is not None:
+            yield decode(output_ids)
+            return
+        output_ids = (yield from model.stream(input_ids, **params)).tolist()
+        self._store(key, output_ids)
+
+    def _lookup(self, key):
+        output_ids = self.memory.get(key)
+        if output_ids is None:
+            output_ids = self._read(key)
+            if output_ids is not None:
+                self._count("disk_hits")
+                self.memory.put(key, output_ids)
+        return output_ids
+
+    def _store(self, key, output_ids):
+        self._write(key, output_ids)
+        self._count("generated")
+        self.memory.put(key, output_ids)
+
+    def _count(self, name):
+        with self.lock:
+            self.counts[name] += 1
+
+    def _path(self, key):
+        return os.path.join(self.directory, key + ".json")
+
+    def _read(self, key):
+        if not self.directory:
+            return None
+        try:
+            with open(self._path(key)) as f:
+                output_ids = json.load(f)
+            os.utime(self._path(key))  # Recently used: kept longest when trimming
+            return output_ids
+        except (OSError, ValueError):
+            return None
+
+    def _write(self, key, output_ids):
+        if not self.directory:
+            return
+        tmp_path = f"{self._path(key)}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_path, "w") as f:
+                json.dump(output_ids, f)
+            os.replace(tmp_path, self._path(key))
+        except OSError as e:
+            print(f"Error writing summary cache: {e}")
+            return
+        with self.lock:
+            self.writes += 1
+            prune = self.writes % _PRUNE_EVERY == 0
+        if prune:
+            self._prune()
+
+    def _prune(self):
+        entries = []
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith(".json"):
+                try:
+                    entries.append((entry.stat().st_mtime, entry.path))
+                except OSError:
+                    pass  # Removed by another process meanwhile
+        entries.sort()
+        for mtime, path in entries[:max(0, len(entries) - self.disk_entries)]:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def stats(self):
+        with self.lock:
+            counts = dict(self.counts)
+        counts["memory"] = self.memory.stats()
+        counts["directory"] = self.directory
+        return counts
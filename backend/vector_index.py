@@ -0,0 +1,355 @@
+import bisect
+import fcntl
+import hashlib
+import json
+import math
+import os
+import threading
+from contextlib import contextmanager
+
+import numpy as np
+
+from retrieval import DEFAULT_TOP_K, normalize_embeddings, top_k_indices
+
+try:
+    import faiss  # Optional: without it every search falls back to the exact scan
+except ImportError:
+    faiss = None
+
+# Where per-user indexes are written (one directory per user)
+INDEX_DIR = os.environ.get("DOCASSIST_INDEX_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "indexes"))
+
+# HNSW graph parameters: more links / a wider search beam trade memory and latency for recall
+HNSW_M = int(os.environ.get("DOCASSIST_HNSW_M", 32))
+HNSW_EF_CONSTRUCTION = int(os.environ.get("DOCASSIST_HNSW_EF_CONSTRUCTION", 100))
+HNSW_EF_SEARCH = int(os.environ.get("DOCASSIST_HNSW_EF_SEARCH", 128))
+
+
+def _write_atomic(path, write):
+    tmp_path = path + ".tmp"
+    write(tmp_path)
+    os.replace(tmp_path, path)
+
+
+def _dump_json(path, data):
+    with open(path, "w") as f:
+        json.dump(data, f)
+
+
+class VectorIndex:
+    """All chunk embeddings of one user, searchable across their whole library.
+
+    On disk a user directory holds:
+      vectors.f32     append-only, row-normalized float32 matrix (exact search and rebuilds)
+      hnsw.faiss      HNSW graph over the same rows (approximate search)
+      documents.json  which contiguous row ranges belong to which document_id; a document
+                      streamed in batches may own several ranges, each starting at chunk "ordinal"
+
+    Every worker process opens its own VectorIndex on the same directory. Writers take an
+    exclusive lock on the directory's .lock file and re-read documents.json before appending,
+    and every access reloads it when another process has replaced it since. Documents streamed
+    in with save=False stay hidden until their upload calls save(document_id).
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.RLock()  # In-memory state; held by searches
+        self._write_lock = threading.RLock()  # Writers of this process, while they wait for and hold the file lock
+        self._lock_file = None
+        self._lock_depth = 0
+        self._stamp = None  # documents.json as last read or written here; None: not loaded
+        self._vectors = None
+        self._ann = None
+        self.dim = None
+        self.documents = []  # [{"document_id", "start", "count", "ordinal"}] ordered by start
+        self._starts = []
+        self._by_id = {}  # document_id -> its segments, in ordinal order
+
+    # Loading -------------------------------------------------------------
+
+    def _file(self, name):
+        return os.path.join(self.path, name)
+
+    def _meta_stamp(self):
+        # Changes whenever documents.json is replaced, by this process or another
+        try:
+            stat = os.stat(self._file("documents.json"))
+        except OSError:
+            return ()
+        return stat.st_ino, stat.st_mtime_ns, stat.st_size
+
+    @contextmanager
+    def _exclusive(self):
+        # Writers in every process take turns on <path>/.lock. self.lock is only taken once the file
+        # lock is held, so searches here don't wait while another process writes, only while this
+        # one updates its state. If the update fails, what it changed in memory is dropped
+        with self._write_lock:
+            if not self._lock_depth:
+                os.makedirs(self.path, exist_ok=True)
+                self._lock_file = open(self._file(".lock"), "a")
+                fcntl.flock(self._lock_file, fcntl.LOCK_EX)
+            self._lock_depth += 1
+            try:
+                with self.lock:
+                    try:
+                        yield
+                    except BaseException:
+                        self._forget()
+                        raise
+            finally:
+                self._lock_depth -= 1
+                if not self._lock_depth:
+                    fcntl.flock(self._lock_file, fcntl.LOCK_UN)
+                    self._lock_file.close()
+                    self._lock_file = None
+
+    def _forget(self):
+        # After a failed write the graph or segments may be ahead of documents.json: the next access
+        # reloads both from disk, and the next writer truncates rows appended past documents.json
+        self._stamp, self._ann, self._vectors = None, None, None
+
+    def _load(self):
+        # (Re)reads documents.json when it changed since this process last read or wrote it
+        stamp = self._meta_stamp()
+        if stamp == self._stamp:
+            return
+        self.documents, self._starts, self._by_id, self._vectors = [], [], {}, None
+        self.dim = None
+        if stamp:
+            with open(self._file("documents.json")) as f:
+                meta = json.load(f)
+            self.dim = meta["dim"]
+            for segment in meta["documents"]:
+                self._add_segment(segment)
+            # The rows are append-only, so a graph built here stays valid and only needs the
+            # rows other processes appended since; the saved graph is read only to start from
+            if self._ann is None and faiss is not None and os.path.exists(self._file("hnsw.faiss")):
+                self._ann = faiss.read_index(self._file("hnsw.faiss"))
+            self._catch_up()
+        self._stamp = stamp
+
+    def _catch_up(self):
+        # Bring the graph up to the rows documents.json describes
+        rows = self._row_count()
+        if self._ann is not None and self._ann.ntotal > rows:
+            self._ann = None
+        if self._ann is not None and self._ann.ntotal < rows:
+            self._ann.add(np.ascontiguousarray(self._load_vectors()[self._ann.ntotal:rows]))
+
+    def _truncate_unsaved(self):
+        # Rows past those documents.json describes were left by a writer that died mid-append.
+        # Only called holding the directory lock, so no other process is appending right now
+        rows = self._row_count()
+        path = self._file("vectors.f32")
+        if self.dim and os.path.exists(path) and os.path.getsize(path) > rows * 4 * self.dim:
+            os.truncate(path, rows * 4 * self.dim)
+
+    def _load_vectors(self):
+        # Memory-mapped so only the pages a search touches are read in; sized by documents.json,
+        # as another process may be appending past it
+        if self._vectors is None and self.dim:
+            rows = self._row_count()
+            if rows:
+                self._vectors = np.memmap(self._file("vectors.f32"), dtype=np.float32, mode="r", shape=(rows, self.dim))
+        return self._vectors
+
+    def _row_count(self):
+        if not self.documents:
+            return 0
+        return self.documents[-1]["start"] + self.documents[-1]["count"]
+
+    def __len__(self):
+        with self.lock:
+            self._load()
+            return self._row_count()
+
+    def has_document(self, document_id):
+        return bool(self._segments(document_id))
+
+    def _segments(self, document_id):
+        with self.lock:
+            self._load()
+            return self._by_id.get(document_id, [])
+
+    def _add_segment(self, segment):
+        segment.setdefault("ordinal", 0)
+        self.documents.append(segment)
+        self._starts.append(segment["start"])
+        if segment.get("deleted"):
+            return
+        segments = self._by_id.setdefault(segment["document_id"], [])
+        segments.append(segment)
+        segments.sort(key=lambda s: s["ordinal"])
+
+    @staticmethod
+    def _hidden(segment):
+        # Removed, or still being streamed in by an upload that hasn't called save() yet
+        return segment.get("deleted") or segment.get("pending")
+
+    # Updates ---------------------------------------------------------------
+
+    def add_document(self, document_id, embeddings, first_ordinal=0, save=True):
+        # Appends chunks first_ordinal.. of a document; adding the same range twice is a no-op.
+        # Pass save=False while streaming batches and call save(document_id) once at the end: until
+        # then the document stays hidden from searches, and the graph file isn't rewritten per batch.
+        vectors = normalize_embeddings(embeddings)
+        if len(vectors) == 0:
+            return
+        with self._exclusive():
+            self._load()
+            if any(s["ordinal"] == first_ordinal for s in self._segments(document_id)):
+                return
+            if self.dim is None:
+                self.dim = vectors.shape[1]
+            elif vectors.shape[1] != self.dim:
+                raise ValueError(f"Embedding size {vectors.shape[1]} does not match index size {self.dim}")
+
+            self._truncate_unsaved()
+            start = self._row_count()
+            with open(self._file("vectors.f32"), "ab") as f:
+                f.write(vectors.tobytes())
+            self._vectors = None
+
+            if faiss is not None:
+                if self._ann is None:
+                    self._ann = faiss.IndexHNSWFlat(self.dim, HNSW_M, faiss.METRIC_INNER_PRODUCT)
+                    self._ann.hnsw.efConstruction = HNSW_EF_CONSTRUCTION
+                    if start:
+                        # Index files were missing or faiss was added later: catch up from the raw vectors
+                        self._ann.add(np.ascontiguousarray(self._load_vectors()[:start]))
+                self._ann.add(vectors)
+
+            segment = {"document_id": document_id, "start": start, "count": len(vectors), "ordinal": first_ordinal}
+            if not save:
+                segment["pending"] = True
+            self._add_segment(segment)
+            # The rows are described before the lock is released, so the next writer appends after them
+            self._write_meta()
+            if save:
+                self.save()
+
+    def remove_document(self, document_id):
+        # HNSW graphs can't delete nodes: the rows stay but are marked deleted and never returned
+        with self._exclusive():
+            self._load()
+            for segment in self._by_id.pop(document_id, []):
+                segment["deleted"] = True
+            self.save()
+
+    def save(self, *document_ids):
+        # Publishes the given documents added with save=False (no others: concurrent uploads
+        # publish their own) and writes the graph
+        with self._exclusive():
+            self._load()
+            if not self.documents:
+                return
+            for document_id in document_ids:
+                for segment in self._by_id.get(document_id, []):
+                    segment.pop("pending", None)
+            if self._ann is not None:
+                _write_atomic(self._file("hnsw.faiss"), lambda p: faiss.write_index(self._ann, p))
+            self._write_meta()
+
+    def _write_meta(self):
+        meta = {"dim": self.dim, "documents": self.documents}
+        _write_atomic(self._file("documents.json"), lambda p: _dump_json(p, meta))
+        self._stamp = self._meta_stamp()
+
+    def version(self):
+        # Changes with every update from any process, e.g. to key cached search results
+        with self.lock:
+            self._load()
+            return self._stamp
+
+    # Search ------------------------------------------------------------------
+
+    def _segment_of(self, row):
+        return self.documents[bisect.bisect_right(self._starts, row) - 1]
+
+    def _results(self, rows, scores, k):
+        results = []
+        for row, score in zip(rows, scores):
+            if row < 0:
+                continue  # faiss pads with -1 when fewer than k neighbours exist
+            segment = self._segment_of(int(row))
+            if self._hidden(segment):
+                continue
+            results.append({
+                "document_id": segment["document_id"],
+                "chunk_index": segment["ordinal"] + int(row) - segment["start"],
+                "score": float(score),
+            })
+        return results[:k]
+
+    def _search_k(self, k):
+        # Ask for extra neighbours, in proportion to the deleted rows that could crowd out live ones
+        deleted = sum(s["count"] for s in self.documents if self._hidden(s))
+        if not deleted:
+            return k
+        total = self._row_count()
+        return min(total, math.ceil(2 * k * total / max(total - deleted, 1)))
+
+    def search(self, query_embedding, k=DEFAULT_TOP_K, document_id=None, exact=False):
+        # Returns [{"document_id", "chunk_index", "score"}, ...] best first
+        query = normalize_embeddings(query_embedding)
+        with self.lock:
+            self._load()
+            if not self.documents:
+                return []
+            if document_id is not None:
+                # A document is one (or a few) contiguous row ranges: an exact scan of them is
+                # cheaper than a filtered graph walk
+                segments = [s for s in self._segments(document_id) if not self._hidden(s)]
+                if not segments:
+                    return []
+                vectors = self._load_vectors()
+                rows = np.concatenate([np.arange(s["start"], s["start"] + s["count"]) for s in segments])
+                scores = np.concatenate([vectors[s["start"]:s["start"] + s["count"]] @ query[0] for s in segments])
+                best = top_k_indices(scores, k)
+                return self._results(rows[best], scores[best], k)
+            if exact or self._ann is None:
+                return self.exact_search(query, k)
+            self._ann.hnsw.efSearch = max(HNSW_EF_SEARCH, self._search_k(k))
+            scores, rows = self._ann.search(query, self._search_k(k))
+            return self._results(rows[0], scores[0], k)
+
+    def exact_search(self, query_embedding, k=DEFAULT_TOP_K):
+        # Brute-force scan of every vector: the ground truth used to measure ANN recall
+        query = normalize_embeddings(query_embedding)
+        with self.lock:
+            self._load()
+            vectors = self._load_vectors()
+            if vectors is None:
+                return []
+            scores = vectors @ query[0]
+            for segment in self.documents:
+                if self._hidden(segment):
+                    scores[segment["start"]:segment["start"] + segment["count"]] = -np.inf
+            rows = top_k_indices(scores, k)
+            return self._results(rows, scores[rows], k)
+
+
+# Indexes are opened lazily and kept for the life of the process
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+def user_index_path(user_id):
+    return os.path.join(INDEX_DIR, hashlib.sha1(str(user_id).encode("utf-8")).hexdigest())
+
+
+def get_user_index(user_id):
+    with _indexes_lock:
+        if user_id not in _indexes:
+            _indexes[user_id] = VectorIndex(user_index_path(user_id))
+        return _indexes[user_id]
+
+
+def recall_at_k(index, queries, k=DEFAULT_TOP_K):
+    # Fraction of the exact top-k that the approximate search also returns
+    hits = 0
+    for query in queries:
+        expected = {(r["document_id"], r["chunk_index"]) for r in index.exact_search(query, k)}
+        found = {(r["document_id"], r["chunk_index"]) for r in index.search(query, k)}
+        hits += len(expected & found)
+    return hits / float(k * len(queries)) if len(queries) else 1.0
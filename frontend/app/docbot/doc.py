@@ -1,14 +1,24 @@
-from flask import Flask, request, jsonify
-from sentence_transformers import SentenceTransformer
-from transformers import BartForConditionalGeneration, BartTokenizer
-import pdfplumber
-import docx
+from flask import Flask, Response, request, jsonify, stream_with_context
 import re
-import spacy
-import numpy as np
 import logging
+import os
+import sys
 from flask_cors import CORS
 
+# Shared retrieval helpers live in the backend package
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "..", "backend"))
+from retrieval import DEFAULT_TOP_K, MAX_TOP_K, parse_top_k
+from chunking import split_into_chunks
+from document_sessions import DocumentSessionStore
+from embedding_cache import EmbeddingCache
+from extraction import extract_files
+from ocr_pages import IMAGE_EXTENSIONS, get_ocr_cache
+from query_cache import QueryCache
+from summarization import DISTILLED_SUMMARY_MODEL, SUMMARY_MODES, Summarizer
+from model_client import EMBEDDING_MODEL, SUMMARY_MODEL, get_model_client
+from model_registry import ModelRegistry, register_models, register_summarizer
+from streaming import SSE_HEADERS, bullet_points, sse
+
 app = Flask(__name__)
 CORS(app)
 
@@ -18,67 +28,75 @@ logging.basicConfig(level=logging.INFO)
 def home():
     return jsonify({"message": "Welcome to DocBot! Upload a PDF and start chatting."})
 
-bart_model = BartForConditionalGeneration.from_pretrained("facebook/bart-large-cnn").to("cpu")
-bert_model = SentenceTransformer('all-MiniLM-L6-v2', device="cpu")
-bart_tokenizer = BartTokenizer.from_pretrained("facebook/bart-large-cnn")
-nlp = spacy.load("en_core_web_sm")
+models = ModelRegistry()  # Loaded by a background warm-up thread or on first use, not at import
+model_client = get_model_client()  # Set DOCASSIST_MODEL_SERVER to use the shared model server
+bert_model, query_encoder, chunk_encoder, bart_tokenizer, bart_generator, sentence_splitter = register_models(models, model_client)
+models.warm_up()
+embedding_cache = EmbeddingCache(EMBEDDING_MODEL, chunk_encoder.encode)  # Chunks seen before aren't re-encoded; concurrent uploads share batches
+query_cache = QueryCache(query_encoder.encode)  # Repeated (document, query) pairs skip encoding and retrieval
+# Summaries in the request's "mode" (see SUMMARY_MODES); same retrieved context: same summary, no generate()
+summarizer = Summarizer(
+    {SUMMARY_MODEL: (bart_tokenizer, bart_generator),
+     DISTILLED_SUMMARY_MODEL: register_summarizer(models, model_client, DISTILLED_SUMMARY_MODEL)},
+    embedding_cache.encode, sentence_splitter,
+)
+sessions = DocumentSessionStore()  # Processed documents stay server-side; clients only hold their session id
 
 def clean_text(text):
     return re.sub(r"\s+", " ", text).strip()
 
-def split_into_chunks(text, max_chunk_size=512):
-    doc = nlp(text)
-    sentences = [sent.text.strip() for sent in doc.sents]
-    chunks, current_chunk = [], ""
-    for sentence in sentences:
-        if len(current_chunk) + len(sentence) <= max_chunk_size:
-            current_chunk += " " + sentence
-        else:
-            chunks.append(current_chunk.strip())
-            current_chunk = sentence
-    if current_chunk:
-        chunks.append(current_chunk.strip())
-    return chunks
-
 def process_text(content):
     cleaned_content = clean_text(content)
-    chunks = split_into_chunks(cleaned_content)
-    embeddings = bert_model.encode(chunks)
-    return [{"text": chunk, "embedding": embeddings[i].tolist()} for i, chunk in enumerate(chunks)]
+    chunks = split_into_chunks(cleaned_content, splitter=sentence_splitter, tokenizer=bert_model.tokenizer, max_tokens=bert_model.max_seq_length)
+    return sessions.create(chunks, embedding_cache.encode(chunks)), len(chunks)
 
 def process_pdf(file):
-    with pdfplumber.open(file) as pdf:
-        content = "".join(page.extract_text() for page in pdf.pages)
-    return process_text(content)
+    # Extracted on the extraction workers, which OCR the pages that have no text layer (scans)
+    return process_text(extract_files([(file.filename, file.read())])[0]["text"])
+
+def process_image(file):
+    # OCR'd on the extraction workers, one page per image frame
+    return process_text(extract_files([(file.filename, file.read())])[0]["text"])
 
 def process_docx(file):
+    import docx
     doc = docx.Document(file)
     content = "\n".join(para.text for para in doc.paragraphs)
     return process_text(content)
 
-def get_answer(user_input, document_chunks):
-    query_embedding = bert_model.encode(user_input)
-    
-    def cosine_similarity(a, b):
-        return np.dot(a, b) / (np.linalg.norm(a) * np.linalg.norm(b))
-
-    results = sorted(
-        [(chunk["text"], cosine_similarity(query_embedding, chunk["embedding"])) for chunk in document_chunks],
-        key=lambda x: x[1],
-        reverse=True
-    )[:3]
-
-    relevant_texts = " ".join([r[0] for r in results])
-    input_ids = bart_tokenizer.encode(relevant_texts, return_tensors='pt', max_length=1024, truncation=True)
-    summary_ids = bart_model.generate(input_ids, max_length=300, min_length=100, length_penalty=2.0, num_beams=4, early_stopping=True)
-    summarized_text = bart_tokenizer.decode(summary_ids[0], skip_special_tokens=True)
+def retrieve(user_input, session_id, session, k=DEFAULT_TOP_K):
+    # Sessions never change, so results are cached under the session id
+    return query_cache.search(session_id, user_input, k, session.search)
+
+def get_answer(user_input, session_id, session, k=DEFAULT_TOP_K, mode=None):
+    results = retrieve(user_input, session_id, session, k)
+
+    relevant_texts = " ".join([text for text, score in results])
+    summarized_text = summarizer.summarize([relevant_texts], mode, query_cache.embed(user_input))[0]
     unique_sentences = list(dict.fromkeys(summarized_text.split('. ')))
     return [{"bullet_point": sentence.strip()} for sentence in unique_sentences if sentence.strip()]   
 
+def stream_answer(user_input, session_id, session, k=DEFAULT_TOP_K, mode=None):
+    # get_answer() as Server-Sent Events: the retrieved chunks as soon as they're known, then the
+    # summary's tokens and bullet points while it's generated, then the full answer
+    try:
+        results = retrieve(user_input, session_id, session, k)
+        yield sse("sources", [{"text": text, "score": float(score)} for text, score in results])
+
+        relevant_texts = " ".join([text for text, score in results])
+        answer = []
+        for event, text in bullet_points(summarizer.stream(relevant_texts, mode, query_cache.embed(user_input))):
+            yield sse(event, {"text": text})
+            if event == "bullet":
+                answer.append({"bullet_point": text})
+        yield sse("done", answer)
+    except Exception as e:
+        logging.error(f"Error streaming answer: {str(e)}")
+        yield sse("error", {"error": f"Error generating answer: {str(e)}"})
+
 @app.route('/api/process-document', methods=['POST'])
 def process_document():
     try:
-        document_chunks = []
         file = request.files.get("file")
         
         if not file:
@@ -88,16 +106,19 @@ def process_document():
         
         if file.filename.endswith(".txt"):
             content = file.read().decode("utf-8")
-            document_chunks = process_text(content)
+            session_id, chunk_count = process_text(content)
         elif file.filename.endswith(".pdf"):
-            document_chunks = process_pdf(file)
+            session_id, chunk_count = process_pdf(file)
         elif file.filename.endswith(".docx"):
-            document_chunks = process_docx(file)
+            session_id, chunk_count = process_docx(file)
+        elif file.filename.endswith(IMAGE_EXTENSIONS):
+            session_id, chunk_count = process_image(file)
         else:
             return jsonify({"error": "Unsupported file format!"}), 400
         
-        logging.info(f"Processed {len(document_chunks)} chunks.")
-        return jsonify({"message": "File processed successfully!", "chunks": document_chunks})
+        logging.info(f"Processed {chunk_count} chunks.")
+        # Chunks and embeddings stay here: later requests send the session id instead
+        return jsonify({"message": "File processed successfully!", "session_id": session_id, "chunk_count": chunk_count})
 
     except Exception as e:
         logging.error(f"Error processing document: {str(e)}")
@@ -108,17 +129,24 @@ def chat():
     try:
         data = request.json
         user_input = data.get("user_input", "")
-        document_chunks = data.get("document_chunks", [])
-
-        if not user_input or not document_chunks:
-            return jsonify({"error": "Missing user input or document chunks!"}), 400
+        session_id = data.get("session_id", "")  # From /api/process-document
+        top_k = parse_top_k(data.get("top_k"))
+        mode = data.get("mode")  # Summary mode, one of SUMMARY_MODES; the configured default if absent
+
+        if not user_input or not session_id:
+            return jsonify({"error": "Missing user input or session id!"}), 400
+        if top_k is None:
+            return jsonify({"error": f"Invalid top_k: {data.get('top_k')}! Use a whole number from 1 to {MAX_TOP_K}."}), 400
+        if mode and mode not in SUMMARY_MODES:
+            return jsonify({"error": f"Unknown mode: {mode}! Use one of {', '.join(SUMMARY_MODES)}."}), 400
+        session = sessions.get(session_id)
+        if session is None:
+            return jsonify({"error": "Document session not found or expired! Upload the document again."}), 404
 
         logging.info(f"User input: {user_input}")
-        logging.info(f"Number of document chunks: {len(document_chunks)}")
-
-        logging.info(f"First chunk: {document_chunks[0]}")
+        logging.info(f"Number of document chunks: {len(session)}")
 
-        answer= get_answer(user_input, document_chunks)
+        answer= get_answer(user_input, session_id, session, top_k, mode)
         logging.info(f"answer generated: {answer}")
 
         return jsonify(answer)
@@ -128,6 +156,56 @@ def chat():
         return jsonify({"error": f"Error generating answer: {str(e)}"}), 500
     
 
+@app.route('/api/chat/stream', methods=['POST'])
+def chat_stream():
+    # Same request as /api/chat; the answer arrives as a text/event-stream
+    data = request.json
+    user_input = data.get("user_input", "")
+    session_id = data.get("session_id", "")
+    top_k = parse_top_k(data.get("top_k"))
+    mode = data.get("mode")
+
+    if not user_input or not session_id:
+        return jsonify({"error": "Missing user input or session id!"}), 400
+    if top_k is None:
+        return jsonify({"error": f"Invalid top_k: {data.get('top_k')}! Use a whole number from 1 to {MAX_TOP_K}."}), 400
+    if mode and mode not in SUMMARY_MODES:
+        return jsonify({"error": f"Unknown mode: {mode}! Use one of {', '.join(SUMMARY_MODES)}."}), 400
+    session = sessions.get(session_id)
+    if session is None:
+        return jsonify({"error": "Document session not found or expired! Upload the document again."}), 404
+
+    logging.info(f"User input (streamed): {user_input}")
+    return Response(stream_with_context(stream_answer(user_input, session_id, session, top_k, mode)),
+                    mimetype="text/event-stream", headers=SSE_HEADERS)
+
+@app.route('/api/sessions/<session_id>', methods=['DELETE'])
+def delete_session(session_id):
+    # Frees a document's session before its TTL runs out
+    if not sessions.delete(session_id):
+        return jsonify({"error": "Document session not found!"}), 404
+    query_cache.invalidate(session_id)
+    return jsonify({"message": "Document session deleted!"})
+
+@app.route('/api/healthz', methods=['GET'])
+def liveness():
+    return jsonify({"status": "alive"})
+
+@app.route('/api/readyz', methods=['GET'])
+def readiness():
+    # Ready once every model is loaded
+    ready = models.ready()
+    return jsonify({"ready": ready, "models": models.status()}), 200 if ready else 503
+
+@app.route('/api/inference-stats', methods=['GET'])
+def inference_stats():
+    return jsonify({"encode": query_encoder.stats(), "encode_chunks": chunk_encoder.stats(), "generate": bart_generator.stats()})
+
+@app.route('/api/cache-stats', methods=['GET'])
+def cache_stats():
+    return jsonify({"embeddings": embedding_cache.stats(), **query_cache.stats(), "summaries": summarizer.stats(),
+                    "sessions": sessions.stats(), "ocr": get_ocr_cache().stats()})
+
 if __name__ == '__main__':
     app.run(host='0.0.0.0', port=8000, debug=True)
 
@@ -268,17 +346,27 @@ if __name__ == '__main__':
 #     app.run(host='0.0.0.0', port=8000, debug=True)
 
 
-from flask import Flask, request, jsonify
-from sentence_transformers import SentenceTransformer
-from transformers import BartForConditionalGeneration, BartTokenizer
-import pdfplumber
-import docx
+from flask import Flask, Response, request, jsonify, stream_with_context
 import re
-import spacy
-import numpy as np
 import logging
+import os
+import sys
 from flask_cors import CORS
 
+# Shared retrieval helpers live in the backend package
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "..", "backend"))
+from retrieval import DEFAULT_TOP_K, MAX_TOP_K, parse_top_k
+from chunking import split_into_chunks
+from document_sessions import DocumentSessionStore
+from embedding_cache import EmbeddingCache
+from extraction import extract_files
+from ocr_pages import IMAGE_EXTENSIONS, get_ocr_cache
+from query_cache import QueryCache
+from summarization import DISTILLED_SUMMARY_MODEL, SUMMARY_MODES, Summarizer
+from model_client import EMBEDDING_MODEL, SUMMARY_MODEL, get_model_client
+from model_registry import ModelRegistry, register_models, register_summarizer
+from streaming import SSE_HEADERS, bullet_points, sse
+
 app = Flask(__name__)
 CORS(app)
 
@@ -288,67 +376,75 @@ logging.basicConfig(level=logging.INFO)
 def home():
     return jsonify({"message": "Welcome to DocBot! Upload a PDF and start chatting."})
 
-bart_model = BartForConditionalGeneration.from_pretrained("facebook/bart-large-cnn").to("cpu")
-bert_model = SentenceTransformer('all-MiniLM-L6-v2', device="cpu")
-bart_tokenizer = BartTokenizer.from_pretrained("facebook/bart-large-cnn")
-nlp = spacy.load("en_core_web_sm")
+models = ModelRegistry()  # Loaded by a background warm-up thread or on first use, not at import
+model_client = get_model_client()  # Set DOCASSIST_MODEL_SERVER to use the shared model server
+bert_model, query_encoder, chunk_encoder, bart_tokenizer, bart_generator, sentence_splitter = register_models(models, model_client)
+models.warm_up()
+embedding_cache = EmbeddingCache(EMBEDDING_MODEL, chunk_encoder.encode)  # Chunks seen before aren't re-encoded; concurrent uploads share batches
+query_cache = QueryCache(query_encoder.encode)  # Repeated (document, query) pairs skip encoding and retrieval
+# Summaries in the request's "mode" (see SUMMARY_MODES); same retrieved context: same summary, no generate()
+summarizer = Summarizer(
+    {SUMMARY_MODEL: (bart_tokenizer, bart_generator),
+     DISTILLED_SUMMARY_MODEL: register_summarizer(models, model_client, DISTILLED_SUMMARY_MODEL)},
+    embedding_cache.encode, sentence_splitter,
+)
+sessions = DocumentSessionStore()  # Processed documents stay server-side; clients only hold their session id
 
 def clean_text(text):
     return re.sub(r"\s+", " ", text).strip()
 
-def split_into_chunks(text, max_chunk_size=512):
-    doc = nlp(text)
-    sentences = [sent.text.strip() for sent in doc.sents]
-    chunks, current_chunk = [], ""
-    for sentence in sentences:
-        if len(current_chunk) + len(sentence) <= max_chunk_size:
-            current_chunk += " " + sentence
-        else:
-            chunks.append(current_chunk.strip())
-            current_chunk = sentence
-    if current_chunk:
-        chunks.append(current_chunk.strip())
-    return chunks
-
 def process_text(content):
     cleaned_content = clean_text(content)
-    chunks = split_into_chunks(cleaned_content)
-    embeddings = bert_model.encode(chunks)
-    return [{"text": chunk, "embedding": embeddings[i].tolist()} for i, chunk in enumerate(chunks)]
+    chunks = split_into_chunks(cleaned_content, splitter=sentence_splitter, tokenizer=bert_model.tokenizer, max_tokens=bert_model.max_seq_length)
+    return sessions.create(chunks, embedding_cache.encode(chunks)), len(chunks)
 
 def process_pdf(file):
-    with pdfplumber.open(file) as pdf:
-        content = "".join(page.extract_text() for page in pdf.pages)
-    return process_text(content)
+    # Extracted on the extraction workers, which OCR the pages that have no text layer (scans)
+    return process_text(extract_files([(file.filename, file.read())])[0]["text"])
+
+def process_image(file):
+    # OCR'd on the extraction workers, one page per image frame
+    return process_text(extract_files([(file.filename, file.read())])[0]["text"])
 
 def process_docx(file):
+    import docx
     doc = docx.Document(file)
     content = "\n".join(para.text for para in doc.paragraphs)
     return process_text(content)
 
-def get_answer(user_input, document_chunks):
-    query_embedding = bert_model.encode(user_input)
-    
-    def cosine_similarity(a, b):
-        return np.dot(a, b) / (np.linalg.norm(a) * np.linalg.norm(b))
-
-    results = sorted(
-        [(chunk["text"], cosine_similarity(query_embedding, chunk["embedding"])) for chunk in document_chunks],
-        key=lambda x: x[1],
-        reverse=True
-    )[:3]
-
-    relevant_texts = " ".join([r[0] for r in results])
-    input_ids = bart_tokenizer.encode(relevant_texts, return_tensors='pt', max_length=1024, truncation=True)
-    summary_ids = bart_model.generate(input_ids, max_length=300, min_length=100, length_penalty=2.0, num_beams=4, early_stopping=True)
-    summarized_text = bart_tokenizer.decode(summary_ids[0], skip_special_tokens=True)
+def retrieve(user_input, session_id, session, k=DEFAULT_TOP_K):
+    # Sessions never change, so results are cached under the session id
+    return query_cache.search(session_id, user_input, k, session.search)
+
+def get_answer(user_input, session_id, session, k=DEFAULT_TOP_K, mode=None):
+    results = retrieve(user_input, session_id, session, k)
+
+    relevant_texts = " ".join([text for text, score in results])
+    summarized_text = summarizer.summarize([relevant_texts], mode, query_cache.embed(user_input))[0]
     unique_sentences = list(dict.fromkeys(summarized_text.split('. ')))
     return [{"bullet_point": sentence.strip()} for sentence in unique_sentences if sentence.strip()]   
 
+def stream_answer(user_input, session_id, session, k=DEFAULT_TOP_K, mode=None):
+    # get_answer() as Server-Sent Events: the retrieved chunks as soon as they're known, then the
+    # summary's tokens and bullet points while it's generated, then the full answer
+    try:
+        results = retrieve(user_input, session_id, session, k)
+        yield sse("sources", [{"text": text, "score": float(score)} for text, score in results])
+
+        relevant_texts = " ".join([text for text, score in results])
+        answer = []
+        for event, text in bullet_points(summarizer.stream(relevant_texts, mode, query_cache.embed(user_input))):
+            yield sse(event, {"text": text})
+            if event == "bullet":
+                answer.append({"bullet_point": text})
+        yield sse("done", answer)
+    except Exception as e:
+        logging.error(f"Error streaming answer: {str(e)}")
+        yield sse("error", {"error": f"Error generating answer: {str(e)}"})
+
 @app.route('/api/process-document', methods=['POST'])
 def process_document():
     try:
-        document_chunks = []
         file = request.files.get("file")
         
         if not file:
@@ -358,16 +454,19 @@ def process_document():
         
         if file.filename.endswith(".txt"):
             content = file.read().decode("utf-8")
-            document_chunks = process_text(content)
+            session_id, chunk_count = process_text(content)
         elif file.filename.endswith(".pdf"):
-            document_chunks = process_pdf(file)
+            session_id, chunk_count = process_pdf(file)
         elif file.filename.endswith(".docx"):
-            document_chunks = process_docx(file)
+            session_id, chunk_count = process_docx(file)
+        elif file.filename.endswith(IMAGE_EXTENSIONS):
+            session_id, chunk_count = process_image(file)
         else:
             return jsonify({"error": "Unsupported file format!"}), 400
         
-        logging.info(f"Processed {len(document_chunks)} chunks.")
-        return jsonify({"message": "File processed successfully!", "chunks": document_chunks})
+        logging.info(f"Processed {chunk_count} chunks.")
+        # Chunks and embeddings stay here: later requests send the session id instead
+        return jsonify({"message": "File processed successfully!", "session_id": session_id, "chunk_count": chunk_count})
 
     except Exception as e:
         logging.error(f"Error processing document: {str(e)}")
@@ -378,17 +477,24 @@ def chat():
     try:
         data = request.json
         user_input = data.get("user_input", "")
-        document_chunks = data.get("document_chunks", [])
-
-        if not user_input or not document_chunks:
-            return jsonify({"error": "Missing user input or document chunks!"}), 400
+        session_id = data.get("session_id", "")  # From /api/process-document
+        top_k = parse_top_k(data.get("top_k"))
+        mode = data.get("mode")  # Summary mode, one of SUMMARY_MODES; the configured default if absent
+
+        if not user_input or not session_id:
+            return jsonify({"error": "Missing user input or session id!"}), 400
+        if top_k is None:
+            return jsonify({"error": f"Invalid top_k: {data.get('top_k')}! Use a whole number from 1 to {MAX_TOP_K}."}), 400
+        if mode and mode not in SUMMARY_MODES:
+            return jsonify({"error": f"Unknown mode: {mode}! Use one of {', '.join(SUMMARY_MODES)}."}), 400
+        session = sessions.get(session_id)
+        if session is None:
+            return jsonify({"error": "Document session not found or expired! Upload the document again."}), 404
 
         logging.info(f"User input: {user_input}")
-        logging.info(f"Number of document chunks: {len(document_chunks)}")
-
-        logging.info(f"First chunk: {document_chunks[0]}")
+        logging.info(f"Number of document chunks: {len(session)}")
 
-        answer= get_answer(user_input, document_chunks)
+        answer= get_answer(user_input, session_id, session, top_k, mode)
         logging.info(f"answer generated: {answer}")
 
         return jsonify(answer)
@@ -398,6 +504,56 @@ def chat():
         return jsonify({"error": f"Error generating answer: {str(e)}"}), 500
     
 
+@app.route('/api/chat/stream', methods=['POST'])
+def chat_stream():
+    # Same request as /api/chat; the answer arrives as a text/event-stream
+    data = request.json
+    user_input = data.get("user_input", "")
+    session_id = data.get("session_id", "")
+    top_k = parse_top_k(data.get("top_k"))
+    mode = data.get("mode")
+
+    if not user_input or not session_id:
+        return jsonify({"error": "Missing user input or session id!"}), 400
+    if top_k is None:
+        return jsonify({"error": f"Invalid top_k: {data.get('top_k')}! Use a whole number from 1 to {MAX_TOP_K}."}), 400
+    if mode and mode not in SUMMARY_MODES:
+        return jsonify({"error": f"Unknown mode: {mode}! Use one of {', '.join(SUMMARY_MODES)}."}), 400
+    session = sessions.get(session_id)
+    if session is None:
+        return jsonify({"error": "Document session not found or expired! Upload the document again."}), 404
+
+    logging.info(f"User input (streamed): {user_input}")
+    return Response(stream_with_context(stream_answer(user_input, session_id, session, top_k, mode)),
+                    mimetype="text/event-stream", headers=SSE_HEADERS)
+
+@app.route('/api/sessions/<session_id>', methods=['DELETE'])
+def delete_session(session_id):
+    # Frees a document's session before its TTL runs out
+    if not sessions.delete(session_id):
+        return jsonify({"error": "Document session not found!"}), 404
+    query_cache.invalidate(session_id)
+    return jsonify({"message": "Document session deleted!"})
+
+@app.route('/api/healthz', methods=['GET'])
+def liveness():
+    return jsonify({"status": "alive"})
+
+@app.route('/api/readyz', methods=['GET'])
+def readiness():
+    # Ready once every model is loaded
+    ready = models.ready()
+    return jsonify({"ready": ready, "models": models.status()}), 200 if ready else 503
+
+@app.route('/api/inference-stats', methods=['GET'])
+def inference_stats():
+    return jsonify({"encode": query_encoder.stats(), "encode_chunks": chunk_encoder.stats(), "generate": bart_generator.stats()})
+
+@app.route('/api/cache-stats', methods=['GET'])
+def cache_stats():
+    return jsonify({"embeddings": embedding_cache.stats(), **query_cache.stats(), "summaries": summarizer.stats(),
+                    "sessions": sessions.stats(), "ocr": get_ocr_cache().stats()})
+
 if __name__ == '__main__':
     app.run(host='0.0.0.0', port=8000, debug=True)
 
@@ -9,9 +9,15 @@ const DocBot = () => {
   const [fileNames, setFileNames] = useState<string[]>([]);
   const [sidebarOpen, setSidebarOpen] = useState(false);
   const [isProcessing, setIsProcessing] = useState(false);
+  const [sessionId, setSessionId] = useState<string | null>(null); // Server-side handle of the processed document
 
   const handleSend = async () => {
     if (!chat.trim()) return;
+    if (!sessionId) {
+      setMessages([...messages, { user: chat, bot: 'Please upload a document first.' }]);
+      setChat('');
+      return;
+    }
     setMessages([...messages, { user: chat, bot: 'Thinking...' }]);
     try {
       const response = await fetch("http://127.0.0.1:8000/api/chat", {
@@ -19,12 +25,15 @@ const DocBot = () => {
         headers: {
           "Content-Type": "application/json",
         },
-        body: JSON.stringify({ question: chat }),
+        body: JSON.stringify({ user_input: chat, session_id: sessionId }),
       });
       const data = await response.json();
+      const answer = Array.isArray(data)
+        ? data.map((point: { bullet_point: string }) => `• ${point.bullet_point}`).join('\n')
+        : data.error;
 
     setMessages((prev) =>
-      prev.slice(0, -1).concat({ user: chat, bot: data.answer || "Error getting response" })
+      prev.slice(0, -1).concat({ user: chat, bot: answer || "Error getting response" })
     );
   } catch (error) {
     console.error("Error fetching response:", error);
@@ -35,18 +44,34 @@ const DocBot = () => {
     setChat('');
   };
 
-  const handleFileUpload = (e: React.ChangeEvent<HTMLInputElement>) => {
+  const handleFileUpload = async (e: React.ChangeEvent<HTMLInputElement>) => {
     const files = e.target.files;
     if (files) {
       setIsProcessing(true);
       const uploadedFiles = Array.from(files).map(file => file.name);
       setFileNames(prev => [...prev, ...uploadedFiles]);
       setMessages([...messages, { user: 'Uploaded Files', bot: 'Processing files...' }]);
-      
-      setTimeout(() => {
-        setMessages(prev => prev.slice(0, -1).concat({ user: 'Uploaded Files', bot: 'Files processed successfully!' }));
-        setIsProcessing(false);
-      }, 3000);
+
+      let status = 'Files processed successfully!';
+      try {
+        // The server keeps chunks and embeddings; chat questions refer to the last processed file by its session id
+        for (const file of Array.from(files)) {
+          const formData = new FormData();
+          formData.append("file", file);
+          const response = await fetch("http://127.0.0.1:8000/api/process-document", {
+            method: "POST",
+            body: formData,
+          });
+          const data = await response.json();
+          if (!data.session_id) throw new Error(data.error);
+          setSessionId(data.session_id);
+        }
+      } catch (error) {
+        console.error("Error processing files:", error);
+        status = 'Failed to process files.';
+      }
+      setMessages(prev => prev.slice(0, -1).concat({ user: 'Uploaded Files', bot: status }));
+      setIsProcessing(false);
     }
   };
 
@@ -77,7 +102,7 @@ const DocBot = () => {
           <h2 className="sidebar-heading">Upload Files</h2>
           <input
             type="file"
-            accept=".pdf"
+            accept=".pdf,.txt,.docx,.png,.jpg,.jpeg,.tif,.tiff"
             multiple
             id="file-upload"
             onChange={handleFileUpload}
@@ -15,7 +15,7 @@ export default function TextEditor() {
   const [uploadedFiles, setUploadedFiles] = useState<string[]>([]);
   const [uploading, setUploading] = useState(false);
   const [suggestions, setSuggestions] = useState<{ id: number; text: string }[]>([]);
-  const [documentChunks, setDocumentChunks] = useState<any[]>([]);
+  const [sessionId, setSessionId] = useState<string | null>(null); // Server-side handle of the processed document
   const [file, setFile] = useState<File | null>(null);
 
   const modules = {
@@ -88,8 +88,8 @@ export default function TextEditor() {
       });
 
       const data = await response.json();
-      if (data.chunks) {
-        setDocumentChunks(data.chunks);
+      if (data.session_id) {
+        setSessionId(data.session_id);
         setUploadedFiles((prevFiles) => [...prevFiles, files[0].name]);
       }
     } catch (error) {
@@ -101,7 +101,7 @@ export default function TextEditor() {
 
   // Fetch suggestions
   const handleGetSuggestions = async () => {
-    if (!file) {
+    if (!file || !sessionId) {
       alert("Please upload a document first.");
       return;
     }
@@ -109,7 +109,7 @@ export default function TextEditor() {
     const response = await fetch("http://127.0.0.1:5000/get-suggestions", {
       method: "POST",
       headers: { "Content-Type": "application/json" },
-      body: JSON.stringify({ user_input: content, document_chunks: documentChunks }),
+      body: JSON.stringify({ user_input: content, session_id: sessionId }),
     });
 
     const data = await response.json();
@@ -190,7 +190,7 @@ export default function TextEditor() {
             type="file"
             multiple
             onChange={handleFileUpload}
-            accept=".pdf,.txt,.docx"
+            accept=".pdf,.txt,.docx,.png,.jpg,.jpeg,.tif,.tiff"
             style={{ display: "none" }}
           />
           {uploading && <p>Uploading...</p>}